@@ -1,148 +1,260 @@
-import hashlib
-from io import BytesIO
 import os
-import pickle
 
-from pdf2image import convert_from_bytes
-from PIL import Image
-from pypdf import PdfReader, PdfWriter
 import streamlit as st
 
+from pdf_editor import instrumentation
+from pdf_editor.documents import DocumentStore, upload_fingerprint
+from pdf_editor.edits import deletion_edit, extraction_edit, reorder_edit, rotation_edit
+from pdf_editor.operations import edit_metadata, get_metadata, merge_pdfs_to_file, read_pdf, unlock_pdf
+from pdf_editor.optimization import OutputOptimizer
+from pdf_editor.page_plan import PagePlan
+from pdf_editor.render_cache import DEFAULT_CACHE_DIR, RenderCache, ThumbnailCache, document_digest
+from pdf_editor.render_engine import map_documents, renderer
+from pdf_editor.rendering import (
+    document_layout, encode_thumbnail, neighbour_windows, page_longest_side, page_window, prefetch, thumbnail_dpi, window_count
+)
+from pdf_editor.selection import PageSelection, parse_ranges
+from pdf_editor.split import bookmark_parts, every_parts, range_parts, split_to_zip
+from pdf_editor.text_index import TextIndexCache, plan_matches
+
+MERGED_DOCUMENT = "merged"
+
 st.set_page_config(
     page_title="PDF Editor",
     layout="wide",
 )
 
-def merge_pdfs(pdf_list, merge_order):
-    pdf_writer = PdfWriter()
-    
-    for idx in merge_order:
-        pdf_file = pdf_list[idx]
-        pdf_reader = PdfReader(pdf_file)
-        for page_num in range(len(pdf_reader.pages)):
-            pdf_writer.add_page(pdf_reader.pages[page_num])
-
-    output = BytesIO()
-    pdf_writer.write(output)
-    output.seek(0)
-    return output
-
-def rotate_pdf(pdf_file, rotation_angle, selected_pages):
-    pdf_reader = PdfReader(pdf_file)
-    pdf_writer = PdfWriter()
-    metadata = pdf_reader.metadata
-
-    for page_num, page in enumerate(pdf_reader.pages):
-        if page_num in selected_pages:
-            page.rotate(rotation_angle)
-        pdf_writer.add_page(page)
-    
-    pdf_writer.add_metadata(metadata)
-    output = BytesIO()
-    pdf_writer.write(output)
-    output.seek(0)
-    return output
-
-def reorder_pages(pdf_file, selected_pages, target_page):
-    pdf_reader = PdfReader(pdf_file)
-    pdf_writer = PdfWriter()
-    metadata = pdf_reader.metadata
-
-    all_pages = list(range(len(pdf_reader.pages)))
-    
-    for page in sorted(selected_pages, reverse=True):
-        all_pages.pop(page)
-
-    insert_index = target_page if target_page == 0 else all_pages.index(target_page - 1) + 1
-    for page in selected_pages:
-        all_pages.insert(insert_index, page)
-        insert_index += 1
-
-    for page_num in all_pages:
-        pdf_writer.add_page(pdf_reader.pages[page_num])
-    
-    pdf_writer.add_metadata(metadata)
-    output = BytesIO()
-    pdf_writer.write(output)
-    output.seek(0)
-    return output
-
-def resize_and_add_black_border(img, target_width, target_height):
-    original_width, original_height = img.size
-
-    aspect_ratio = original_width / original_height
-
-    if target_width / target_height > aspect_ratio:
-        new_height = target_height
-        new_width = int(target_height * aspect_ratio)
+def get_document_store():
+    if "documents" not in st.session_state:
+        st.session_state.documents = DocumentStore(
+            int(os.environ.get("PDF_EDITOR_SESSION_MEMORY_MB", 512)) * 1024 ** 2,
+            int(os.environ.get("PDF_EDITOR_PROCESS_MEMORY_MB", 4096)) * 1024 ** 2,
+            int(os.environ.get("PDF_EDITOR_SESSION_DISK_MB", 2048)) * 1024 ** 2,
+            os.environ.get("PDF_EDITOR_SPOOL_DIR"),
+        )
+    return st.session_state.documents
+
+def spool_upload(uploaded_file):
+    return get_document_store().spool(upload_fingerprint(uploaded_file), uploaded_file)
+
+def open_document(uploaded_file):
+    fingerprint = upload_fingerprint(uploaded_file)
+    get_document_store().spool(fingerprint, uploaded_file)
+    document = get_document_store().document(fingerprint)
+
+    if st.session_state.get("current_document") != fingerprint or "selected_pages" not in st.session_state:
+        st.session_state.current_document = fingerprint
+        st.session_state.selected_pages = PageSelection()
+
+    if "preview" not in document:
+        document["preview"] = load_preview(document["path"])
+    return document
+
+@st.cache_resource
+def get_render_cache():
+    return RenderCache(os.environ.get("PDF_EDITOR_CACHE_DIR", DEFAULT_CACHE_DIR))
+
+@st.cache_resource
+def get_thumbnail_cache():
+    return ThumbnailCache()
+
+@st.cache_resource
+def get_text_index_cache():
+    return TextIndexCache()
+
+def new_optimizer(output_settings):
+    optimize_output, image_dpi, image_quality, _ = output_settings
+    if not optimize_output:
+        return None
+    return OutputOptimizer(image_dpi=image_dpi, image_quality=image_quality)
+
+def show_optimization_report(optimizer):
+    if optimizer is None:
+        return
+    report = optimizer.report
+    change = (report["bytes_out"] / report["bytes_in"] - 1) * 100 if report["bytes_in"] else 0
+    st.caption(
+        f"Optimized output: {report['bytes_in'] / 1024:.0f} KiB in, {report['bytes_out'] / 1024:.0f} KiB out ({change:+.0f}%), "
+        f"{report['images_recompressed']} images re-encoded, {report['streams_compressed']} streams compressed, "
+        f"{report['objects_removed']} objects removed in {report['seconds'] * 1000:.0f} ms"
+    )
+
+def show_file_download(label, path, file_name, mime="application/pdf"):
+    with open(path, "rb") as output_file:
+        st.download_button(label=label, data=output_file, file_name=file_name, mime=mime)
+
+def spool_merge(merge_key, pdf_list, merge_order, optimizer=None):
+    # The merged file belongs to no upload, so it is kept as the output of a
+    # store entry of its own, which is pinned while merge mode is shown and
+    # evicted like any other output afterwards.
+    store = get_document_store()
+    document = store.document(MERGED_DOCUMENT)
+    if "output" not in document or document["output"][0] != merge_key:
+        output_path = store.spool_path(f"{MERGED_DOCUMENT}_output.pdf")
+        with open(output_path, "wb") as output_file:
+            merge_pdfs_to_file(pdf_list, merge_order, output_file, optimizer)
+        document["output"] = (merge_key, output_path, optimizer)
+    return document["output"]
+
+def load_preview(pdf_path):
+    page_count, longest_side = document_layout(pdf_path)
+    digest = document_digest(pdf_path)
+    return {
+        "path": pdf_path,
+        "digest": digest,
+        "page_count": page_count,
+        "longest_side": longest_side,
+        "plan": PagePlan.from_document(digest, pdf_path, page_count),
+    }
+
+def show_undo_redo(plan):
+    undo_col, redo_col = st.columns(2)
+    with undo_col:
+        if st.button("Undo", disabled=not plan.can_undo(), use_container_width=True):
+            plan.undo()
+            st.session_state.selected_pages = PageSelection()
+            st.rerun()
+    with redo_col:
+        if st.button("Redo", disabled=not plan.can_redo(), use_container_width=True):
+            plan.redo()
+            st.session_state.selected_pages = PageSelection()
+            st.rerun()
+
+def show_plan_download(document, label, file_name):
+    plan = document["preview"]["plan"]
+    # Reset to Original starts a new plan whose versions count up from 0
+    # again, so the output is keyed by the plan object as well.
+    output_key = (plan, plan.version, output_settings)
+    if "output" in document and document["output"][0] == output_key:
+        show_file_download(f"Download {label} PDF", document["output"][1], file_name)
+        show_optimization_report(document["output"][2])
+    elif st.button(f"Prepare {label} PDF"):
+        optimizer = new_optimizer(output_settings)
+        output_path = get_document_store().spool_path(f"{st.session_state.current_document}_output.pdf")
+        with open(output_path, "wb") as output_file:
+            plan.write(optimizer, incremental=output_settings[3], output=output_file)
+        document["output"] = (output_key, output_path, optimizer)
+        st.rerun()
+
+def show_split_download(document, parts, file_name):
+    split_key = (tuple(parts), output_settings)
+    if "split" in document and document["split"][0] == split_key:
+        show_file_download(f"Download {len(parts)} PDFs as ZIP", document["split"][1], file_name, mime="application/zip")
+        show_optimization_report(document["split"][2])
+    elif st.button("Prepare ZIP"):
+        optimizer = new_optimizer(output_settings)
+        store = get_document_store()
+        output_path = store.spool_path(f"{st.session_state.current_document}_split.zip")
+        with open(output_path, "wb") as output_file:
+            split_to_zip(document["path"], parts, output_file, optimizer, spool_dir=store.spool_dir)
+        document["split"] = (split_key, output_path, optimizer)
+        st.rerun()
+
+def show_selection_input(page_count, key):
+    expression = st.text_input("Select pages by number", placeholder="e.g. 1-500, 702, 900-", key=f"{key}_expression")
+    if st.button("Select", key=f"{key}_select"):
+        try:
+            st.session_state.selected_pages = PageSelection.parse(expression, page_count)
+        except ValueError as e:
+            st.error(str(e))
+
+def show_text_search(document, key):
+    preview = document["preview"]
+    text_index = get_text_index_cache().index(preview["digest"], preview["path"], preview["page_count"])
+
+    query = st.text_input("Find pages containing", placeholder="e.g. invoice 2024", key=f"{key}_query")
+    if text_index.error:
+        st.caption(f"Text search is unavailable: {text_index.error}")
+    elif not text_index.done:
+        st.caption(f"Indexing text: {text_index.indexed} of {text_index.page_count} pages so far")
+
+    if st.button("Select matching pages", key=f"{key}_search", disabled=not query.strip()):
+        matches = plan_matches(preview["plan"].pages, preview["digest"], text_index.search(query))
+        st.session_state.selected_pages = st.session_state.selected_pages | matches
+        st.caption(f"{len(matches)} matching pages" + (f": {matches}" if matches else ""))
+
+def toggle_page(page):
+    st.session_state.selected_pages.toggle(page)
+
+def show_page_grid(document, button_key):
+    preview = document["preview"]
+    plan_pages = preview["plan"].pages
+    page_count = len(plan_pages)
+    windows = window_count(pages_per_view, page_count)
+    window_index = 0
+    if windows > 1:
+        window_key = f"{button_key}_window"
+        if st.session_state.get(window_key, 1) > windows:
+            st.session_state[window_key] = windows
+        window_index = st.number_input(f"View (1-{windows})", min_value=1, max_value=windows, step=1, key=window_key) - 1
+
+    pages = page_window(window_index, pages_per_view, page_count)
+    dpi = thumbnail_dpi(image_size, preview["longest_side"])
+    render_cache = get_render_cache()
+    st.caption(f"Showing pages {pages.start + 1}-{pages.stop} of {page_count}")
+
+    cols = st.columns(cols_per_row)
+
+    # Pages whose encoded thumbnail is cached are never looked up in the
+    # render cache, so a rerun of the selection fragment only costs lookups.
+    thumbnail_cache = get_thumbnail_cache()
+    window_pages = plan_pages[pages.start:pages.stop]
+    thumbnail_keys = [(preview["digest"], plan_page.page_index, plan_page.rotation, image_size) for plan_page in window_pages]
+    thumbnails = [thumbnail_cache.get(thumbnail_key) for thumbnail_key in thumbnail_keys]
+    missing = [plan_page.page_index for plan_page, thumbnail in zip(window_pages, thumbnails) if thumbnail is None]
+    images = render_cache.iter_pages(preview["path"], missing, dpi=dpi, digest=preview["digest"])
+
+    for position, (plan_page, thumbnail_key, thumbnail) in enumerate(zip(window_pages, thumbnail_keys, thumbnails)):
+        i = pages.start + position
+        if thumbnail is None:
+            _, image = next(images)
+            thumbnail = encode_thumbnail(image, plan_page.rotation, image_size)
+            thumbnail_cache.put(thumbnail_key, thumbnail)
+
+        col = cols[position % cols_per_row]
+        with col:
+            st.button(
+                f"Page {i+1}",
+                key=f"{button_key}_{i+1}",
+                type="primary" if i in st.session_state.selected_pages else "secondary",
+                on_click=toggle_page,
+                args=(i,),
+            )
+            st.image(thumbnail, caption=f"Page {i+1}", width=image_size)
+
+    for neighbour in neighbour_windows(window_index, pages_per_view, page_count):
+        neighbour_pages = [plan_page.page_index for plan_page in plan_pages[neighbour.start:neighbour.stop]]
+        prefetch(render_cache, preview["path"], neighbour_pages, dpi, preview["digest"])
+
+@st.fragment
+def show_page_selector(document, button_key, instructions, allow_select_all=False):
+    # Everything that only changes the selection reruns as a fragment, so a
+    # page click costs one window of cached thumbnails, not a full app rerun.
+    page_count = len(document["preview"]["plan"].pages)
+
+    if allow_select_all and st.button("Select All"):
+        st.session_state.selected_pages = PageSelection.all(page_count)
+
+    if st.button("Reset Selection"):
+        st.session_state.selected_pages = PageSelection()
+
+    show_selection_input(page_count, button_key)
+
+    show_text_search(document, button_key)
+
+    st.write(instructions)
+
+    show_page_grid(document, button_key)
+
+    if st.session_state.selected_pages:
+        st.write(f"Selected pages ({len(st.session_state.selected_pages)}): {st.session_state.selected_pages}")
     else:
-        new_width = target_width
-        new_height = int(target_width / aspect_ratio)
-
-    img = img.resize((new_width, new_height))
-
-    new_image = Image.new("RGB", (target_width, target_height), (0, 0, 0))
-    offset_x = (target_width - new_width) // 2
-    offset_y = (target_height - new_height) // 2
-    new_image.paste(img, (offset_x, offset_y))
-
-    return new_image
-
-def delete_pages(pdf_file, selected_pages):
-    pdf_reader = PdfReader(pdf_file)
-    pdf_writer = PdfWriter()
-    metadata = pdf_reader.metadata
-
-    for page_num, page in enumerate(pdf_reader.pages):
-        if page_num not in selected_pages:
-            pdf_writer.add_page(page)
-    
-    pdf_writer.add_metadata(metadata)
-    output = BytesIO()
-    pdf_writer.write(output)
-    output.seek(0)
-    return output
-
-def extract_pages(pdf_file, selected_pages):
-    pdf_reader = PdfReader(pdf_file)
-    pdf_writer = PdfWriter()
-    metadata = pdf_reader.metadata
-
-    for page_num in selected_pages:
-        pdf_writer.add_page(pdf_reader.pages[page_num])
-    
-    pdf_writer.add_metadata(metadata)
-    output = BytesIO()
-    pdf_writer.write(output)
-    output.seek(0)
-    return output
-
-def get_metadata(pdf_file):
-    pdf_reader = PdfReader(pdf_file)
-    return pdf_reader.metadata
-
-def edit_metadata(pdf_file, new_metadata):
-    pdf_reader = PdfReader(pdf_file)
-    pdf_writer = PdfWriter()
-
-    for page in pdf_reader.pages:
-        pdf_writer.add_page(page)
-
-    pdf_writer.add_metadata(new_metadata)
-
-    output = BytesIO()
-    pdf_writer.write(output)
-    output.seek(0)
-    return output
-
-def calculate_object_hash(obj):
-    obj_bytes = pickle.dumps(obj)
-    return hashlib.md5(obj_bytes).hexdigest()
+        st.write("No pages selected.")
 
 
 option = st.sidebar.radio(
     "Select an action",
-    options=["Merge PDFs", "Rotate Pages", "Reorder Pages", "Delete or Extract Pages", "Unlock PDF", "Edit PDF Metadata"]
+    options=["Merge PDFs", "Rotate Pages", "Reorder Pages", "Delete or Extract Pages", "Split PDF", "Unlock PDF", "Edit PDF Metadata"]
 )
 
 with st.sidebar.expander("Settings", expanded=False):
@@ -150,6 +262,54 @@ with st.sidebar.expander("Settings", expanded=False):
 
     image_size = st.slider("Thumbnail size (width and height)", min_value=100, max_value=500, value=200)
 
+    pages_per_view = st.selectbox("Number of pages per view", options=[12, 24, 48, 96], index=1)
+
+with st.sidebar.expander("Output", expanded=False):
+    optimize_output = st.checkbox("Optimize output size", value=False)
+    image_dpi = st.selectbox(
+        "Downsample images to",
+        options=[None, 300, 150, 96],
+        format_func=lambda dpi: "Keep resolution" if dpi is None else f"{dpi} DPI",
+        disabled=not optimize_output,
+    )
+    image_quality = None
+    if st.checkbox("Re-encode images as JPEG", value=False, disabled=not optimize_output):
+        image_quality = st.slider("JPEG quality", min_value=30, max_value=95, value=75, disabled=not optimize_output)
+
+    incremental_save = st.checkbox(
+        "Save rotations and metadata edits incrementally",
+        value=True,
+        help="Appends only the changed objects to the original file, which is much faster for large PDFs. "
+        "Metadata edits that change or remove a value are always rewritten, so the old value does not stay in the file.",
+    )
+
+output_settings = (optimize_output, image_dpi, image_quality, incremental_save)
+
+with st.sidebar.expander("Render cache", expanded=False):
+    st.caption(f"Renderer: {renderer.name}")
+    st.json({**get_render_cache().stats(), **get_thumbnail_cache().stats(), **get_text_index_cache().stats()})
+
+with st.sidebar.expander("Session memory", expanded=False):
+    st.json(get_document_store().stats())
+
+get_document_store().begin_run()
+instrumentation.begin_run(st.session_state, get_render_cache().stats())
+
+if instrumentation.ENABLED:
+    with st.sidebar.expander("Performance", expanded=False):
+        last_run = st.session_state.get("perf_last_run")
+        if last_run:
+            st.write(
+                f"Last rerun: {last_run['seconds'] * 1000:.0f} ms, "
+                f"{last_run['cache_hits']} cache hits, {last_run['cache_misses']} misses"
+            )
+            st.table({
+                name: {field: round(value, 4) if field == "seconds" else value for field, value in stage.items()}
+                for name, stage in sorted(last_run["stages"].items())
+            })
+        else:
+            st.write("No completed rerun yet.")
+
 
 st.title("PDF Editor")
 
@@ -159,27 +319,40 @@ if option == "Merge PDFs":
     uploaded_files = st.file_uploader("Upload PDF files", type=["pdf"], accept_multiple_files=True)
 
     if uploaded_files:
-        if "file_hash_m" in st.session_state and st.session_state.file_hash_m != calculate_object_hash(uploaded_files):
-            del st.session_state.pdf_images_
+        merge_files = tuple(upload_fingerprint(file) for file in uploaded_files)
+        merge_paths = [spool_upload(file) for file in uploaded_files]
+        if "merge_files" in st.session_state and st.session_state.merge_files != merge_files:
             if "merge_order" in st.session_state:
                 del st.session_state.merge_order
 
-        st.session_state.file_hash_m = calculate_object_hash(uploaded_files)
+        st.session_state.merge_files = merge_files
 
-        st.session_state.pdf_images_ = []
         file_names = [file.name for file in uploaded_files]
 
-        for file in uploaded_files:
-            st.session_state.pdf_images_.append(convert_from_bytes(file.read(), first_page=0, last_page=1))
+        render_cache = get_render_cache()
+        thumbnail_cache = get_thumbnail_cache()
+
+        def first_page_thumbnail(upload):
+            path, fingerprint = upload
+            thumbnail_key = (fingerprint, 0, 0, image_size)
+            thumbnail = thumbnail_cache.get(thumbnail_key)
+            if thumbnail is None:
+                first_page = read_pdf(path).pages[0]
+                dpi = thumbnail_dpi(image_size, page_longest_side(first_page))
+                thumbnail = encode_thumbnail(render_cache.get_page(path, 0, dpi=dpi), 0, image_size)
+                thumbnail_cache.put(thumbnail_key, thumbnail)
+            return thumbnail
+
+        pdf_images = map_documents(first_page_thumbnail, list(zip(merge_paths, merge_files)))
 
         if "merge_order" not in st.session_state:
             st.session_state.merge_order = []
 
-        if any(m + 1 > len(st.session_state.pdf_images_) for m in st.session_state.merge_order):
+        if any(m + 1 > len(pdf_images) for m in st.session_state.merge_order):
             st.session_state.merge_order = []
 
         if st.button("Select All"):
-            st.session_state.merge_order = list(range(len(st.session_state.pdf_images_)))
+            st.session_state.merge_order = list(range(len(pdf_images)))
 
         if st.button("Reset Selection"):
             st.session_state.merge_order = []
@@ -188,7 +361,7 @@ if option == "Merge PDFs":
 
         cols = st.columns(cols_per_row)
 
-        for i, (pdf_image, file_name) in enumerate(zip(st.session_state.pdf_images_, file_names)):
+        for i, (pdf_image, file_name) in enumerate(zip(pdf_images, file_names)):
             col = cols[i % cols_per_row]
             with col:
                 if st.button(f"PDF {i+1}", key=f"PDF_{i+1}"):
@@ -197,8 +370,7 @@ if option == "Merge PDFs":
                     else:
                         st.session_state.merge_order.append(i)
 
-                tmp_image = resize_and_add_black_border(pdf_image[0], image_size, image_size)
-                st.image(tmp_image, caption=file_name, width=image_size)
+                st.image(pdf_image, caption=file_name, width=image_size)
 
         if st.session_state.merge_order:
             st.write(f"Selected merge order: {[i + 1 for i in st.session_state.merge_order]}")
@@ -206,13 +378,11 @@ if option == "Merge PDFs":
             st.write("No PDF selected for merging.")
 
         if st.session_state.merge_order:
-            merged_pdfs = merge_pdfs(uploaded_files, st.session_state.merge_order)
-            st.download_button(
-                label="Download Merged PDF",
-                data=merged_pdfs,
-                file_name="merged_pdfs.pdf",
-                mime="application/pdf"
-            )
+            merge_key = (st.session_state.merge_files, tuple(st.session_state.merge_order), output_settings)
+            _, merged_path, optimizer = spool_merge(merge_key, merge_paths, st.session_state.merge_order, new_optimizer(output_settings))
+
+            show_file_download("Download Merged PDF", merged_path, "merged_pdfs.pdf")
+            show_optimization_report(optimizer)
     else:
         st.info("Please upload PDF files to merge.")
 
@@ -220,79 +390,34 @@ elif option == "Rotate Pages":
     uploaded_file = st.file_uploader("Upload a PDF file to rotate", type=["pdf"])
 
     if uploaded_file:
-        if "file_hash_ro" in st.session_state and st.session_state.file_hash_ro != calculate_object_hash(uploaded_file):
-            del st.session_state.pdf_images
-            del st.session_state.selected_pages
-            if "rotated_pdf" in st.session_state:
-                del st.session_state.rotated_pdf
-
-        st.session_state.file_hash_ro = calculate_object_hash(uploaded_file)
-
-        if "pdf_images" not in st.session_state or st.session_state.pdf_images is None:
-            st.session_state.pdf_images = convert_from_bytes(uploaded_file.read())
-
-        if "selected_pages" not in st.session_state:
-            st.session_state.selected_pages = []
+        document = open_document(uploaded_file)
+        preview = document["preview"]
         
         if st.button("Reset to Original"):
-            st.session_state.pdf_images = convert_from_bytes(uploaded_file.read())
-            st.session_state.selected_pages = []
-            if "updated_pdf" in st.session_state:
-                del st.session_state.updated_pdf
+            document["preview"] = load_preview(document["path"])
+            st.session_state.selected_pages = PageSelection()
             st.success("PDF has been reset to the original upload state!")
             st.rerun()
 
-        if st.button("Select All"):
-            st.session_state.selected_pages = list(range(len(st.session_state.pdf_images)))
-
-        if st.button("Reset Selection"):
-            st.session_state.selected_pages = []
+        show_undo_redo(preview["plan"])
 
-        st.write("Click on a thumbnail to select/deselect pages for rotation:")
-
-        cols = st.columns(cols_per_row)
-
-        for i, image in enumerate(st.session_state.pdf_images):
-            col = cols[i % cols_per_row]
-            with col:
-                if st.button(f"Page {i+1}", key=f"page_{i+1}"):
-                    if i in st.session_state.selected_pages:
-                        st.session_state.selected_pages.remove(i)
-                    else:
-                        st.session_state.selected_pages.append(i)
-
-                tmp_image = resize_and_add_black_border(image, image_size, image_size)
-                st.image(tmp_image, caption=f"Page {i+1}", width=image_size)
-
-        if st.session_state.selected_pages:
-            st.write(f"Selected pages: {[i + 1 for i in st.session_state.selected_pages]}")
-        else:
-            st.write("No pages selected.")
+        show_page_selector(document, "page", "Click on a thumbnail to select/deselect pages for rotation:", allow_select_all=True)
 
         rotation_angle = st.selectbox("Choose rotation angle", (90, 180, 270))
 
         if st.button("Rotate"):
             if st.session_state.selected_pages:
-                if "rotated_pdf" in st.session_state:
-                    st.session_state.rotated_pdf = rotate_pdf(st.session_state.rotated_pdf, rotation_angle, st.session_state.selected_pages)
-                else:
-                    st.session_state.rotated_pdf = rotate_pdf(uploaded_file, rotation_angle, st.session_state.selected_pages)
+                preview["plan"].apply(rotation_edit(st.session_state.selected_pages, rotation_angle))
                 st.success("Selected pages rotated successfully!")
 
-                st.session_state.pdf_images = convert_from_bytes(st.session_state.rotated_pdf.read())
-                st.session_state.selected_pages = []
+                st.session_state.selected_pages = PageSelection()
                 st.rerun()
             else:
                 st.error("Please select at least one page to rotate.")
         
-        if "rotated_pdf" in st.session_state:
+        if preview["plan"].version:
             base_name, _ = os.path.splitext(uploaded_file.name)
-            st.download_button(
-                label="Download Rotated PDF",
-                data=st.session_state.rotated_pdf,
-                file_name=base_name + "_rotated.pdf",
-                mime="application/pdf"
-            )
+            show_plan_download(document, "Rotated", base_name + "_rotated.pdf")
 
     else:
         st.info("Please upload a PDF file to see available pages.")
@@ -301,53 +426,20 @@ elif option == "Reorder Pages":
     uploaded_file = st.file_uploader("Upload a PDF file to reorder", type=["pdf"])
 
     if uploaded_file:
-        if "file_hash_re" in st.session_state and st.session_state.file_hash_re != calculate_object_hash(uploaded_file):
-            del st.session_state.pdf_images
-            del st.session_state.selected_pages
-            if "reordered_pdf" in st.session_state:
-                del st.session_state.reordered_pdf
-
-        st.session_state.file_hash_re = calculate_object_hash(uploaded_file)
-
-        if "pdf_images" not in st.session_state or st.session_state.pdf_images is None:
-            st.session_state.pdf_images = convert_from_bytes(uploaded_file.read())
-
-        if "selected_pages" not in st.session_state:
-            st.session_state.selected_pages = []
+        document = open_document(uploaded_file)
+        preview = document["preview"]
 
         if st.button("Reset to Original"):
-            st.session_state.pdf_images = convert_from_bytes(uploaded_file.read())
-            st.session_state.selected_pages = []
-            if "updated_pdf" in st.session_state:
-                del st.session_state.updated_pdf
+            document["preview"] = load_preview(document["path"])
+            st.session_state.selected_pages = PageSelection()
             st.success("PDF has been reset to the original upload state!")
             st.rerun()
 
-        if st.button("Reset Selection"):
-            st.session_state.selected_pages = []
-
-        st.write("Click on a thumbnail to select/deselect pages for reordering:")
+        show_undo_redo(preview["plan"])
 
-        cols = st.columns(cols_per_row)
+        show_page_selector(document, "page", "Click on a thumbnail to select/deselect pages for reordering:")
 
-        for i, image in enumerate(st.session_state.pdf_images):
-            col = cols[i % cols_per_row]
-            with col:
-                if st.button(f"Page {i+1}", key=f"page_{i+1}"):
-                    if i in st.session_state.selected_pages:
-                        st.session_state.selected_pages.remove(i)
-                    else:
-                        st.session_state.selected_pages.append(i)
-
-                tmp_image = resize_and_add_black_border(image, image_size, image_size)
-                st.image(tmp_image, caption=f"Page {i+1}", width=image_size)
-
-        if st.session_state.selected_pages:
-            st.write(f"Selected pages: {[i + 1 for i in st.session_state.selected_pages]}")
-        else:
-            st.write("No pages selected.")
-
-        tmp_target_page = [i for i in range(len(st.session_state.pdf_images))]
+        tmp_target_page = [i for i in range(len(preview["plan"].pages))]
         tmp_target_page = [item for item in tmp_target_page if item not in st.session_state.selected_pages]
         tmp_target_page = [0] + [i + 1 for i in tmp_target_page]
         target_page = st.selectbox("Select the page after which the selected pages should be moved",
@@ -355,113 +447,101 @@ elif option == "Reorder Pages":
 
         if st.button("Reorder"):
             if st.session_state.selected_pages:
-                if "reordered_pdf" in st.session_state:
-                    st.session_state.reordered_pdf = reorder_pages(st.session_state.reordered_pdf, st.session_state.selected_pages, target_page)
-                else:
-                    st.session_state.reordered_pdf = reorder_pages(uploaded_file, st.session_state.selected_pages, target_page)
+                plan = preview["plan"]
+                plan.apply(reorder_edit(len(plan.pages), st.session_state.selected_pages, target_page))
                 st.success("Pages reordered successfully!")
 
-                st.session_state.pdf_images = convert_from_bytes(st.session_state.reordered_pdf.read())
-                st.session_state.selected_pages = []
+                st.session_state.selected_pages = PageSelection()
                 st.rerun()
             else:
                 st.error("Please select at least one page to reorder.")
 
-        if "reordered_pdf" in st.session_state:
+        if preview["plan"].version:
             base_name, _ = os.path.splitext(uploaded_file.name)
-            st.download_button(
-                label="Download Reordered PDF",
-                data=st.session_state.reordered_pdf,
-                file_name=base_name + "_reordered.pdf",
-                mime="application/pdf"
-            )
+            show_plan_download(document, "Reordered", base_name + "_reordered.pdf")
     else:
         st.info("Please upload a PDF file to reorder.")
 elif option == "Delete or Extract Pages":
     uploaded_file = st.file_uploader("Upload a PDF file to delete or extract pages", type=["pdf"])
 
     if uploaded_file:
-        if "file_hash_del_ext" in st.session_state and st.session_state.file_hash_del_ext != calculate_object_hash(uploaded_file):
-            del st.session_state.pdf_images
-            del st.session_state.selected_pages
-            if "updated_pdf" in st.session_state:
-                del st.session_state.updated_pdf
-
-        st.session_state.file_hash_del_ext = calculate_object_hash(uploaded_file)
-
-        if "pdf_images" not in st.session_state or st.session_state.pdf_images is None:
-            st.session_state.pdf_images = convert_from_bytes(uploaded_file.read())
-
-        if "selected_pages" not in st.session_state:
-            st.session_state.selected_pages = []
+        document = open_document(uploaded_file)
+        preview = document["preview"]
 
         if st.button("Reset to Original"):
-            st.session_state.pdf_images = convert_from_bytes(uploaded_file.read())
-            st.session_state.selected_pages = []
-            if "updated_pdf" in st.session_state:
-                del st.session_state.updated_pdf
+            document["preview"] = load_preview(document["path"])
+            st.session_state.selected_pages = PageSelection()
             st.success("PDF has been reset to the original upload state!")
             st.rerun()
 
-        if st.button("Reset Selection"):
-            st.session_state.selected_pages = []
-
-        st.write("Click on a thumbnail to select/deselect pages to delete or extract:")
-
-        cols = st.columns(cols_per_row)
-
-        for i, image in enumerate(st.session_state.pdf_images):
-            col = cols[i % cols_per_row]
-            with col:
-                if st.button(f"Page {i+1}", key=f"page_del_ext_{i+1}"):
-                    if i in st.session_state.selected_pages:
-                        st.session_state.selected_pages.remove(i)
-                    else:
-                        st.session_state.selected_pages.append(i)
-
-                tmp_image = resize_and_add_black_border(image, image_size, image_size)
-                st.image(tmp_image, caption=f"Page {i+1}", width=image_size)
+        show_undo_redo(preview["plan"])
 
-        if st.session_state.selected_pages:
-            st.write(f"Selected pages: {[i + 1 for i in st.session_state.selected_pages]}")
-        else:
-            st.write("No pages selected.")
+        show_page_selector(document, "page_del_ext", "Click on a thumbnail to select/deselect pages to delete or extract:")
 
-        if len(st.session_state.pdf_images) == 1:
+        if len(preview["plan"].pages) == 1:
             action = st.radio("Choose action", ("Extract Selected Pages (Cannot delete. There is only one page.)"))
         else:
             action = st.radio("Choose action", ("Delete Selected Pages", "Extract Selected Pages"))
 
         if st.button("Apply"):
             if st.session_state.selected_pages:
+                plan = preview["plan"]
                 if action == "Delete Selected Pages":
-                    st.session_state.updated_pdf = delete_pages(uploaded_file, st.session_state.selected_pages)
+                    plan.apply(deletion_edit(len(plan.pages), st.session_state.selected_pages))
                 elif action == "Extract Selected Pages":
-                    st.session_state.updated_pdf = extract_pages(uploaded_file, st.session_state.selected_pages)
+                    plan.apply(extraction_edit(st.session_state.selected_pages))
                 
                 st.success(f"Pages {action.lower()} successfully!")
 
-                st.session_state.pdf_images = convert_from_bytes(st.session_state.updated_pdf.read())
-                st.session_state.selected_pages = []
+                st.session_state.selected_pages = PageSelection()
                 st.rerun()
             else:
                 st.error("Please select at least one page.")
 
-        if "updated_pdf" in st.session_state:
+        if preview["plan"].version:
             base_name, _ = os.path.splitext(uploaded_file.name)
-            st.download_button(
-                label=f"Download {action.split()[0]}d PDF",
-                data=st.session_state.updated_pdf,
-                file_name=base_name + f"_{action.split()[0].lower()}d.pdf",
-                mime="application/pdf"
-            )
+            show_plan_download(document, f"{action.split()[0]}d", base_name + f"_{action.split()[0].lower()}d.pdf")
     else:
         st.info("Please upload a PDF file to delete or extract pages.")
+elif option == "Split PDF":
+    uploaded_file = st.file_uploader("Upload a PDF file to split", type=["pdf"])
+
+    if uploaded_file:
+        document = open_document(uploaded_file)
+        page_count = document["preview"]["page_count"]
+
+        split_by = st.radio("Split by", ("Page ranges", "Every N pages", "Bookmarks"))
+
+        parts = []
+        if split_by == "Page ranges":
+            expression = st.text_input("One file per range", placeholder="e.g. 1-10, 11-25, 26-")
+            try:
+                parts = range_parts(parse_ranges(expression), page_count)
+            except ValueError as e:
+                st.error(str(e))
+        elif split_by == "Every N pages":
+            every = st.number_input("Pages per file", min_value=1, max_value=page_count, value=1, step=1)
+            parts = every_parts(page_count, every)
+        else:
+            if "bookmark_parts" not in document:
+                document["bookmark_parts"] = bookmark_parts(read_pdf(document["path"]))
+            parts = document["bookmark_parts"]
+            if not parts:
+                st.info("This PDF has no bookmarks.")
+
+        if parts:
+            names = ", ".join(part.name for part in parts[:5])
+            st.write(f"{len(parts)} files: {names}" + (", ..." if len(parts) > 5 else ""))
+            base_name, _ = os.path.splitext(uploaded_file.name)
+            show_split_download(document, parts, base_name + "_split.zip")
+    else:
+        st.info("Please upload a PDF file to split.")
 elif option == "Unlock PDF":
     uploaded_file = st.file_uploader("Upload a password-protected PDF", type=["pdf"])
 
     if uploaded_file:
-        pdf_reader = PdfReader(uploaded_file)
+        pdf_path = spool_upload(uploaded_file)
+        pdf_reader = read_pdf(pdf_path)
 
         if not pdf_reader.is_encrypted:
             st.success("This PDF is not password-protected.")
@@ -470,23 +550,15 @@ elif option == "Unlock PDF":
 
             if st.button("Unlock PDF"):
                 try:
-                    if pdf_reader.decrypt(password):
-                        pdf_writer = PdfWriter()
-                        for page in pdf_reader.pages:
-                            pdf_writer.add_page(page)
-
-                        output = BytesIO()
-                        pdf_writer.write(output)
-                        output.seek(0)
-
+                    optimizer = new_optimizer(output_settings)
+                    output_path = get_document_store().spool_path(f"{upload_fingerprint(uploaded_file)}_unlocked.pdf")
+                    with open(output_path, "wb") as output_file:
+                        output = unlock_pdf(pdf_path, password, optimizer, output_file)
+                    if output is not None:
                         st.success("Password removed successfully!")
                         base_name, _ = os.path.splitext(uploaded_file.name)
-                        st.download_button(
-                            label="Download Unlocked PDF",
-                            data=output,
-                            file_name=base_name + f"_unlocked.pdf",
-                            mime="application/pdf"
-                        )
+                        show_file_download("Download Unlocked PDF", output_path, base_name + f"_unlocked.pdf")
+                        show_optimization_report(optimizer)
                     else:
                         st.error("Incorrect password. Please try again.")
 
@@ -498,7 +570,8 @@ elif option == "Edit PDF Metadata":
     uploaded_file = st.file_uploader("Upload a PDF file to edit metadata", type=["pdf"])
 
     if uploaded_file:
-        metadata = get_metadata(uploaded_file)
+        pdf_path = spool_upload(uploaded_file)
+        metadata = get_metadata(pdf_path)
         st.subheader("Current Metadata")
 
         if metadata:
@@ -522,15 +595,17 @@ elif option == "Edit PDF Metadata":
                     updated_metadata[default_key] = new_value
 
         if st.button("Apply Metadata Changes"):
-            updated_pdf = edit_metadata(uploaded_file, updated_metadata)
+            optimizer = new_optimizer(output_settings)
+            output_path = get_document_store().spool_path(f"{upload_fingerprint(uploaded_file)}_metadata_updated.pdf")
+            with open(output_path, "wb") as output_file:
+                edit_metadata(pdf_path, updated_metadata, optimizer, incremental=incremental_save, output=output_file)
 
             base_name, _ = os.path.splitext(uploaded_file.name)
             st.success("Metadata updated successfully!")
-            st.download_button(
-                label="Download PDF with Updated Metadata",
-                data=updated_pdf,
-                file_name=base_name + f"_metadata_updated.pdf",
-                mime="application/pdf"
-            )
+            show_file_download("Download PDF with Updated Metadata", output_path, base_name + f"_metadata_updated.pdf")
+            show_optimization_report(optimizer)
     else:
         st.info("Please upload a PDF file to edit its metadata.")
+
+get_document_store().enforce_budget()
+instrumentation.end_run(st.session_state, get_render_cache().stats())
@@ -0,0 +1,120 @@
+from io import BytesIO
+import os
+import random
+
+from PIL import Image
+from pypdf import PdfWriter
+from pypdf.generic import DecodedStreamObject, DictionaryObject, NameObject, NumberObject, StreamObject
+
+CORPUS_DIR = os.path.join(os.path.dirname(__file__), ".corpus")
+PAGE_WIDTH = 612
+PAGE_HEIGHT = 792
+
+WORDS = (
+    "invoice contract amount total payment delivery account reference customer order "
+    "report quarter revenue balance schedule section clause party agreement signature"
+).split()
+
+KINDS = ("text", "image", "scan")
+
+
+def jpeg_stream(image, quality=80):
+    buffer = BytesIO()
+    image.save(buffer, format="JPEG", quality=quality)
+
+    stream = StreamObject()
+    stream._data = buffer.getvalue()
+    stream.update({
+        NameObject("/Type"): NameObject("/XObject"),
+        NameObject("/Subtype"): NameObject("/Image"),
+        NameObject("/Width"): NumberObject(image.width),
+        NameObject("/Height"): NumberObject(image.height),
+        NameObject("/ColorSpace"): NameObject("/DeviceGray" if image.mode == "L" else "/DeviceRGB"),
+        NameObject("/BitsPerComponent"): NumberObject(8),
+        NameObject("/Filter"): NameObject("/DCTDecode"),
+    })
+    return stream
+
+
+def synthetic_image(rng, width, height, mode):
+    # A small random image scaled up: smooth enough to compress like a scan or
+    # a photo, and fully determined by the seed.
+    bands = 1 if mode == "L" else 3
+    small = Image.frombytes(mode, (max(1, width // 16), max(1, height // 16)), rng.randbytes(max(1, width // 16) * max(1, height // 16) * bands))
+    return small.resize((width, height), Image.Resampling.BILINEAR)
+
+
+def content_stream(pdf_writer, text):
+    stream = DecodedStreamObject()
+    stream.set_data(text.encode("latin-1"))
+    return pdf_writer._add_object(stream.flate_encode())
+
+
+def add_page(pdf_writer, content, resources):
+    page = pdf_writer.add_blank_page(PAGE_WIDTH, PAGE_HEIGHT)
+    page[NameObject("/Contents")] = content_stream(pdf_writer, content)
+    page[NameObject("/Resources")] = resources
+    return page
+
+
+def text_lines(rng, count):
+    return [" ".join(rng.choice(WORDS) for _ in range(12)) for _ in range(count)]
+
+
+def build_document(kind, page_count, seed=0):
+    rng = random.Random(f"{kind}-{page_count}-{seed}")
+    pdf_writer = PdfWriter()
+
+    font = pdf_writer._add_object(DictionaryObject({
+        NameObject("/Type"): NameObject("/Font"),
+        NameObject("/Subtype"): NameObject("/Type1"),
+        NameObject("/BaseFont"): NameObject("/Helvetica"),
+    }))
+    image_pool = []
+    if kind == "image":
+        image_pool = [pdf_writer._add_object(jpeg_stream(synthetic_image(rng, 400, 300, "RGB"))) for _ in range(8)]
+
+    for page_num in range(page_count):
+        if kind == "text":
+            lines = " ".join(f"({line}) '" for line in text_lines(rng, 50))
+            content = f"BT /F1 10 Tf 12 TL 50 750 Td (Page {page_num + 1}) ' {lines} ET"
+            resources = DictionaryObject({NameObject("/Font"): DictionaryObject({NameObject("/F1"): font})})
+        elif kind == "image":
+            names = DictionaryObject()
+            draws = []
+            for slot in range(4):
+                names[NameObject(f"/Im{slot}")] = rng.choice(image_pool)
+                x, y = 40 + (slot % 2) * 280, 420 - (slot // 2) * 260
+                draws.append(f"q 260 0 0 195 {x} {y} cm /Im{slot} Do Q")
+            content = " ".join(draws) + f" BT /F1 12 Tf 40 740 Td (Page {page_num + 1}) Tj ET"
+            resources = DictionaryObject({
+                NameObject("/Font"): DictionaryObject({NameObject("/F1"): font}),
+                NameObject("/XObject"): names,
+            })
+        elif kind == "scan":
+            scan = pdf_writer._add_object(jpeg_stream(synthetic_image(rng, 850, 1100, "L"), quality=60))
+            content = f"q {PAGE_WIDTH} 0 0 {PAGE_HEIGHT} 0 0 cm /Scan Do Q"
+            resources = DictionaryObject({NameObject("/XObject"): DictionaryObject({NameObject("/Scan"): scan})})
+        else:
+            raise ValueError(f"unknown document kind: {kind}")
+
+        add_page(pdf_writer, content, resources)
+
+    pdf_writer.add_metadata({"/Title": f"Synthetic {kind} document", "/Author": "pdf_editor benchmarks"})
+    output = BytesIO()
+    pdf_writer.write(output)
+    return output.getvalue()
+
+
+def document_path(kind, page_count, seed=0, corpus_dir=CORPUS_DIR):
+    path = os.path.join(corpus_dir, f"{kind}_{page_count}_{seed}.pdf")
+    if not os.path.exists(path):
+        os.makedirs(corpus_dir, exist_ok=True)
+        with open(path + ".tmp", "wb") as pdf_file:
+            pdf_file.write(build_document(kind, page_count, seed))
+        os.replace(path + ".tmp", path)
+    return path
+
+
+def small_file_set(file_count, pages_per_file=2, corpus_dir=CORPUS_DIR):
+    return [document_path("text", pages_per_file, seed, corpus_dir) for seed in range(file_count)]
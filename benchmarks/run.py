@@ -0,0 +1,229 @@
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+from io import BytesIO
+import json
+import multiprocessing
+import os
+import sys
+import time
+
+from PIL import Image
+
+from benchmarks.corpus import KINDS, document_path, small_file_set
+from pdf_editor.operations import (
+    delete_pages, edit_metadata, extract_pages, merge_pdfs, merge_pdfs_to_file, reorder_pages, rotate_pdf
+)
+from pdf_editor.optimization import OutputOptimizer
+from pdf_editor.render_engine import RENDERERS, shutdown_pdfium_executor
+from pdf_editor.rendering import document_layout, encode_thumbnail, resize_and_add_black_border, thumbnail_dpi
+from pdf_editor.split import every_parts, split_to_zip
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+DEFAULT_BASELINE = os.path.join(os.path.dirname(__file__), "baseline.json")
+PRESETS = {
+    "quick": {"pages": [1, 10, 100], "small_files": [10, 50]},
+    "full": {"pages": [1, 100, 1000, 10000], "small_files": [50, 300]},
+}
+THUMBNAIL_SIZE = 200
+RENDER_DPI = 100
+
+
+def every_other_page(page_count):
+    return list(range(0, page_count, 2))
+
+
+def thumbnail_document(pdf_bytes, page_count):
+    from pdf2image import convert_from_bytes
+
+    _, longest_side = document_layout(pdf_bytes)
+    return convert_from_bytes(pdf_bytes, dpi=thumbnail_dpi(THUMBNAIL_SIZE, longest_side))
+
+
+def letterbox_pages(pdf_bytes, page_count):
+    page = Image.new("RGB", (1700, 2200), (255, 255, 255))
+    return [resize_and_add_black_border(page, THUMBNAIL_SIZE, THUMBNAIL_SIZE) for _ in range(page_count)]
+
+
+def encode_page_thumbnails(pdf_bytes, page_count):
+    page = Image.new("RGB", (1700, 2200), (255, 255, 255))
+    return [encode_thumbnail(page, 90 * (page_num % 4), THUMBNAIL_SIZE) for page_num in range(page_count)]
+
+
+def render_with(backend, first_page_only):
+    # render_first_page_* is timed from a cold start (see measure) to show
+    # the backend's start-up cost, render_pages_* its per-page cost.
+    def render(pdf_bytes, page_count):
+        last_page = 0 if first_page_only else page_count - 1
+        return [image for _, image in RENDERERS[backend]().render_ranges(pdf_bytes, [(0, last_page)], RENDER_DPI)]
+    return render
+
+
+def merge_in_memory(paths):
+    return merge_pdfs(paths, range(len(paths)))
+
+
+def merge_to_file(paths):
+    output = BytesIO()
+    merge_pdfs_to_file(paths, range(len(paths)), output)
+    return output
+
+
+DOCUMENT_OPERATIONS = {
+    "rotate_pdf": lambda pdf_bytes, page_count: rotate_pdf(BytesIO(pdf_bytes), 90, every_other_page(page_count))[0],
+    "reorder_pages": lambda pdf_bytes, page_count: reorder_pages(BytesIO(pdf_bytes), every_other_page(page_count), 0)[0],
+    "delete_pages": lambda pdf_bytes, page_count: delete_pages(BytesIO(pdf_bytes), every_other_page(page_count)[1:])[0],
+    "extract_pages": lambda pdf_bytes, page_count: extract_pages(BytesIO(pdf_bytes), every_other_page(page_count))[0],
+    "edit_metadata": lambda pdf_bytes, page_count: edit_metadata(BytesIO(pdf_bytes), {"/Title": "Benchmark"}),
+    "optimize_output": lambda pdf_bytes, page_count: edit_metadata(
+        BytesIO(pdf_bytes), {"/Title": "Benchmark"}, OutputOptimizer(image_dpi=150, image_quality=75)
+    ),
+    "convert_from_bytes": thumbnail_document,
+    "resize_and_add_black_border": letterbox_pages,
+    "encode_thumbnail": encode_page_thumbnails,
+    "split_every_10": lambda pdf_bytes, page_count: split_to_zip(pdf_bytes, every_parts(page_count, 10), BytesIO(), workers=1),
+}
+for backend in RENDERERS:
+    DOCUMENT_OPERATIONS[f"render_first_page_{backend}"] = render_with(backend, True)
+    DOCUMENT_OPERATIONS[f"render_pages_{backend}"] = render_with(backend, False)
+PER_PAGE_OPERATIONS = {f"render_pages_{backend}" for backend in RENDERERS}
+COLD_START_OPERATIONS = {f"render_first_page_{backend}" for backend in RENDERERS}
+
+MERGE_OPERATIONS = {
+    "merge_pdfs": merge_in_memory,
+    "merge_pdfs_to_file": merge_to_file,
+}
+
+
+def output_size(output):
+    if isinstance(output, BytesIO):
+        return output.getbuffer().nbytes
+    return None
+
+
+def peak_rss_kb():
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak // 1024 if sys.platform == "darwin" else peak
+
+
+def measure(task, repeat):
+    # Runs in a fresh child process so the peak RSS belongs to this case only.
+    kind, target, operation = task
+    if kind == "merge":
+        func, argument = MERGE_OPERATIONS[operation], target
+        call = lambda: func(argument)
+    else:
+        with open(target, "rb") as pdf_file:
+            pdf_bytes = pdf_file.read()
+        page_count, _ = document_layout(pdf_bytes)
+        func = DOCUMENT_OPERATIONS[operation]
+        call = lambda: func(pdf_bytes, page_count)
+
+    timings = []
+    output = None
+    try:
+        for _ in range(repeat):
+            # The PDFium worker pool outlives a call, so it is stopped first
+            # or every repeat after the first would skip its start-up.
+            if operation in COLD_START_OPERATIONS:
+                shutdown_pdfium_executor()
+            started = time.perf_counter()
+            output = call()
+            timings.append(time.perf_counter() - started)
+    finally:
+        shutdown_pdfium_executor()
+
+    result = {"seconds": min(timings), "peak_rss_kb": peak_rss_kb(), "output_bytes": output_size(output)}
+    if operation in PER_PAGE_OPERATIONS:
+        result["per_page_seconds"] = min(timings) / page_count
+    return result
+
+
+def build_tasks(preset, kinds, operations):
+    tasks = []
+    for kind in kinds:
+        for page_count in preset["pages"]:
+            path = document_path(kind, page_count)
+            for operation in DOCUMENT_OPERATIONS:
+                if operation in operations:
+                    tasks.append((f"{kind}_{page_count}/{operation}", (kind, path, operation)))
+
+    for file_count in preset["small_files"]:
+        paths = small_file_set(file_count)
+        for operation in MERGE_OPERATIONS:
+            if operation in operations:
+                tasks.append((f"small_files_{file_count}/{operation}", ("merge", paths, operation)))
+    return tasks
+
+
+def run(tasks, repeat):
+    context = multiprocessing.get_context("fork" if "fork" in multiprocessing.get_all_start_methods() else "spawn")
+    results = {}
+    for name, task in tasks:
+        # Pool processes are daemonic and cannot start the render workers of
+        # their own; an executor's are not.
+        with ProcessPoolExecutor(max_workers=1, mp_context=context) as executor:
+            try:
+                results[name] = executor.submit(measure, task, repeat).result()
+            except Exception as e:
+                print(f"{name:<48} skipped: {e}", flush=True)
+                continue
+
+        result = results[name]
+        output_bytes = "-" if result["output_bytes"] is None else f"{result['output_bytes'] / 1024:.0f} KiB"
+        peak = "-" if result["peak_rss_kb"] is None else f"{result['peak_rss_kb'] / 1024:.0f} MiB"
+        per_page = f"{result['per_page_seconds'] * 1000:.2f} ms/page" if "per_page_seconds" in result else ""
+        print(f"{name:<48} {result['seconds'] * 1000:10.1f} ms {peak:>10} {output_bytes:>12} {per_page}", flush=True)
+    return results
+
+
+def compare(results, baseline, threshold):
+    regressions = []
+    for name, result in results.items():
+        if name not in baseline:
+            continue
+        for metric in ("seconds", "peak_rss_kb"):
+            before, after = baseline[name].get(metric), result.get(metric)
+            if before and after and after > before * (1 + threshold):
+                regressions.append(f"{name} {metric}: {before} -> {after} (+{(after / before - 1) * 100:.0f}%)")
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark PDF Editor operations on a synthetic corpus.")
+    parser.add_argument("--preset", choices=sorted(PRESETS), default="quick")
+    parser.add_argument("--kinds", nargs="+", choices=KINDS, default=list(KINDS))
+    parser.add_argument("--operations", nargs="+", default=list(DOCUMENT_OPERATIONS) + list(MERGE_OPERATIONS))
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE)
+    parser.add_argument("--threshold", type=float, default=0.2, help="allowed slowdown before a case counts as a regression")
+    parser.add_argument("--save-baseline", action="store_true", help="store these results as the new baseline")
+    args = parser.parse_args(argv)
+
+    results = run(build_tasks(PRESETS[args.preset], args.kinds, args.operations), args.repeat)
+
+    if args.save_baseline:
+        with open(args.baseline, "w", encoding="utf-8") as baseline_file:
+            json.dump(results, baseline_file, indent=2, sort_keys=True)
+        print(f"Saved baseline to {args.baseline}")
+        return 0
+
+    if not os.path.exists(args.baseline):
+        print(f"No baseline at {args.baseline}; run with --save-baseline to create one.")
+        return 0
+
+    with open(args.baseline, encoding="utf-8") as baseline_file:
+        regressions = compare(results, json.load(baseline_file), args.threshold)
+    for regression in regressions:
+        print(f"REGRESSION {regression}")
+    print(f"{len(regressions)} regressions over {args.threshold * 100:.0f}% against {args.baseline}")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
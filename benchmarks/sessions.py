@@ -0,0 +1,271 @@
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+import json
+import math
+import os
+import sys
+import time
+from unittest.mock import MagicMock
+
+from pypdf import PdfReader, PdfWriter
+import streamlit as st
+from streamlit.runtime import Runtime
+from streamlit.runtime.caching.storage.dummy_cache_storage import MemoryCacheStorageManager
+from streamlit.runtime.media_file_manager import MediaFileManager
+from streamlit.runtime.memory_media_file_storage import MemoryMediaFileStorage
+from streamlit.runtime.scriptrunner.script_cache import ScriptCache
+from streamlit.runtime.uploaded_file_manager import UploadedFile, UploadedFileRec
+from streamlit.testing.v1 import AppTest
+
+from benchmarks.corpus import document_path, small_file_set
+
+APP_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "app.py")
+UPLOADS_KEY = "benchmark_uploads"
+PASSWORD = "benchmark"
+PRESETS = {
+    "quick": {"pages": [10, 100], "sessions": [1, 4]},
+    "full": {"pages": [10, 100, 1000], "sessions": [1, 4, 16]},
+}
+
+
+def share_runtime():
+    # AppTest installs a fresh mock runtime for every run and removes it when
+    # the run ends, so overlapping runs would pull it from under each other.
+    # Sessions on one server share a runtime; give every run the same one.
+    runtime = MagicMock(spec=Runtime)
+    runtime.media_file_mgr = MediaFileManager(MemoryMediaFileStorage("/mock/media"))
+    runtime.cache_storage_manager = MemoryCacheStorageManager()
+    Runtime.instance = classmethod(lambda cls: runtime)
+    Runtime.exists = classmethod(lambda cls: True)
+
+    # Each run also compiles the script into a cache of its own, and parsing
+    # it in many threads at once can fail; a server compiles it once.
+    script_cache = ScriptCache()
+    get_bytecode = ScriptCache.get_bytecode
+    ScriptCache.get_bytecode = lambda self, script_path: get_bytecode(script_cache, script_path)
+
+
+def serve_uploads():
+    # AppTest cannot drive st.file_uploader, so each simulated session keeps
+    # its uploads in session state and the uploader hands them back.
+    file_uploader = st.file_uploader
+
+    def benchmark_file_uploader(label, type=None, accept_multiple_files=False, **kwargs):
+        uploads = st.session_state.get(UPLOADS_KEY)
+        if uploads is None:
+            return file_uploader(label, type=type, accept_multiple_files=accept_multiple_files, **kwargs)
+        files = [
+            UploadedFile(UploadedFileRec(file_id=file_id, name=name, type="application/pdf", data=data), None)
+            for file_id, name, data in uploads["multiple" if accept_multiple_files else "single"]
+        ]
+        return files if accept_multiple_files else files[0]
+
+    st.file_uploader = benchmark_file_uploader
+
+
+def read_file(path):
+    with open(path, "rb") as pdf_file:
+        return pdf_file.read()
+
+
+def encrypted(data):
+    pdf_writer = PdfWriter(clone_from=PdfReader(BytesIO(data)))
+    pdf_writer.encrypt(PASSWORD)
+    output = BytesIO()
+    pdf_writer.write(output)
+    return output.getvalue()
+
+
+def button(at, label=None, key=None):
+    if key is not None:
+        return at.button(key=key)
+    return next(widget for widget in at.button if widget.label == label)
+
+
+def select_pages(prefix, *pages):
+    return [(f"select page {page}", lambda at, page=page: at.button(key=f"{prefix}_{page}").click().run()) for page in pages]
+
+
+# Each scenario is the list of interactions a user makes after choosing the
+# mode, each one followed by a full rerun of the app.
+SCENARIOS = {
+    "Merge PDFs": lambda: [
+        ("select all", lambda at: button(at, "Select All").click().run()),
+    ],
+    "Rotate Pages": lambda: select_pages("page", 1, 3) + [
+        ("rotate", lambda at: button(at, "Rotate").click().run()),
+        ("prepare", lambda at: button(at, "Prepare Rotated PDF").click().run()),
+    ],
+    "Reorder Pages": lambda: select_pages("page", 2, 4) + [
+        ("reorder", lambda at: button(at, "Reorder").click().run()),
+        ("prepare", lambda at: button(at, "Prepare Reordered PDF").click().run()),
+    ],
+    "Delete or Extract Pages": lambda: [
+        ("type query", lambda at: at.text_input(key="page_del_ext_query").set_value("invoice").run()),
+        ("search", lambda at: button(at, key="page_del_ext_search").click().run()),
+        ("reset selection", lambda at: button(at, "Reset Selection").click().run()),
+    ] + select_pages("page_del_ext", 1) + [
+        ("apply", lambda at: button(at, "Apply").click().run()),
+        ("prepare", lambda at: button(at, "Prepare Deleted PDF").click().run()),
+    ],
+    "Split PDF": lambda: [
+        ("split every n", lambda at: at.main.radio[0].set_value("Every N pages").run()),
+        ("set n", lambda at: next(widget for widget in at.number_input if widget.label == "Pages per file").set_value(5).run()),
+        ("prepare", lambda at: button(at, "Prepare ZIP").click().run()),
+    ],
+    "Unlock PDF": lambda: [
+        ("type password", lambda at: at.text_input[0].set_value(PASSWORD).run()),
+        ("unlock", lambda at: button(at, "Unlock PDF").click().run()),
+    ],
+    "Edit PDF Metadata": lambda: [
+        ("edit title", lambda at: at.text_input[0].set_value("Benchmark").run()),
+        ("apply", lambda at: button(at, "Apply Metadata Changes").click().run()),
+    ],
+}
+MODES = list(SCENARIOS)
+
+
+def case_files(mode, page_count):
+    # Built once before the sessions start, so they never generate the same
+    # corpus file at once.
+    data = read_file(document_path("text", page_count))
+    if mode == "Unlock PDF":
+        data = encrypted(data)
+    merge_files = [read_file(path) for path in small_file_set(4, pages_per_file=max(1, page_count // 4))]
+    return data, merge_files
+
+
+def session_uploads(files, page_count, session):
+    # Every session uploads its own copy, with its own file_id, as separate
+    # users would; the content is shared so render caches behave as in use.
+    data, merge_files = files
+    return {
+        "single": [(f"session{session}_{page_count}", f"document_{page_count}.pdf", data)],
+        "multiple": [
+            (f"session{session}_{page_count}_{index}", f"part_{index}.pdf", part)
+            for index, part in enumerate(merge_files)
+        ],
+    }
+
+
+def run_session(mode, page_count, files, session, timeout):
+    at = AppTest.from_file(APP_PATH, default_timeout=timeout)
+    at.session_state[UPLOADS_KEY] = session_uploads(files, page_count, session)
+
+    steps = [
+        ("open app", lambda at: at.run()),
+        ("upload", lambda at: at.sidebar.radio[0].set_value(mode).run()),
+    ] + SCENARIOS[mode]()
+
+    latencies = []
+    errors = []
+    for name, step in steps:
+        started = time.perf_counter()
+        try:
+            step(at)
+        except Exception as e:
+            errors.append(f"{name}: {e!r}")
+            break
+        latencies.append(time.perf_counter() - started)
+        if at.exception:
+            errors.append(f"{name}: {at.exception[0].value}")
+            break
+
+    # What the session memory budget counts; spooled uploads and outputs
+    # are budgeted separately.
+    store = at.session_state["documents"] if "documents" in at.session_state else None
+    return {
+        "latencies": latencies,
+        "errors": errors,
+        "session_bytes": store.nbytes() if store is not None else 0,
+        "spool_bytes": store.spool_nbytes() if store is not None else 0,
+    }
+
+
+def percentile(values, fraction):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(fraction * len(ordered)) - 1)]
+
+
+def rss_bytes():
+    try:
+        with open("/proc/self/statm", encoding="ascii") as statm:
+            return int(statm.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError):
+        return 0
+
+
+def run_case(mode, page_count, sessions, timeout):
+    files = case_files(mode, page_count)
+    rss_before = rss_bytes()
+    with ThreadPoolExecutor(max_workers=sessions) as executor:
+        futures = [executor.submit(run_session, mode, page_count, files, session, timeout) for session in range(sessions)]
+        results = [future.result() for future in futures]
+    rss_after = rss_bytes()
+
+    latencies = [latency for result in results for latency in result["latencies"]]
+    return {
+        "mode": mode,
+        "pages": page_count,
+        "sessions": sessions,
+        "reruns": len(latencies),
+        "p50": percentile(latencies, 0.50),
+        "p95": percentile(latencies, 0.95),
+        "p99": percentile(latencies, 0.99),
+        "max": max(latencies, default=0.0),
+        "session_bytes": sum(result["session_bytes"] for result in results) / sessions,
+        "spool_bytes": sum(result["spool_bytes"] for result in results) / sessions,
+        "rss_per_session": max(0, rss_after - rss_before) / sessions,
+        "errors": [error for result in results for error in result["errors"]],
+    }
+
+
+def print_case(case):
+    print(
+        f"{case['mode']:<24} {case['pages']:>6} {case['sessions']:>4} {case['reruns']:>7} "
+        f"{case['p50'] * 1000:>9.0f} {case['p95'] * 1000:>9.0f} {case['p99'] * 1000:>9.0f} "
+        f"{case['session_bytes'] / 1024 ** 2:>11.1f} {case['spool_bytes'] / 1024 ** 2:>11.1f} "
+        f"{case['rss_per_session'] / 1024 ** 2:>11.1f}",
+        flush=True,
+    )
+    for error in case["errors"][:3]:
+        print(f"    ERROR {error}", flush=True)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Measure app rerun latency with many concurrent simulated sessions.")
+    parser.add_argument("--preset", choices=sorted(PRESETS), default="quick")
+    parser.add_argument("--modes", nargs="+", choices=MODES, default=MODES, metavar="MODE")
+    parser.add_argument("--pages", nargs="+", type=int, help="document sizes (default: from the preset)")
+    parser.add_argument("--sessions", nargs="+", type=int, help="numbers of concurrent sessions (default: from the preset)")
+    parser.add_argument("--timeout", type=float, default=300, help="seconds allowed for one rerun")
+    parser.add_argument("--output", help="also write the results to this JSON file")
+    args = parser.parse_args(argv)
+
+    share_runtime()
+    serve_uploads()
+
+    preset = PRESETS[args.preset]
+    print(
+        f"{'mode':<24} {'pages':>6} {'sess':>4} {'reruns':>7} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} "
+        f"{'store MiB':>11} {'spool MiB':>11} {'RSS MiB':>11}"
+    )
+    cases = []
+    for sessions in args.sessions or preset["sessions"]:
+        for page_count in args.pages or preset["pages"]:
+            for mode in args.modes:
+                case = run_case(mode, page_count, sessions, args.timeout)
+                print_case(case)
+                cases.append(case)
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as output_file:
+            json.dump(cases, output_file, indent=2)
+    return 1 if any(case["errors"] for case in cases) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,5 @@
+import sys
+
+from pdf_editor.cli import main
+
+sys.exit(main())
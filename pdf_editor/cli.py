@@ -0,0 +1,288 @@
+import argparse
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import glob
+import json
+import os
+import sys
+import time
+
+from pdf_editor.operations import (
+    delete_pages, edit_metadata, extract_pages, merge_pdfs_to_file, read_pdf, reorder_pages, rotate_pdf, unlock_pdf
+)
+from pdf_editor.optimization import OutputOptimizer
+from pdf_editor.selection import PageSelection, parse_ranges
+
+OUTPUT_SUFFIXES = {
+    "rotate": "rotated",
+    "reorder": "reordered",
+    "delete": "deleted",
+    "extract": "extracted",
+    "unlock": "unlocked",
+    "metadata": "metadata_updated",
+}
+OPERATIONS = ["merge"] + list(OUTPUT_SUFFIXES)
+
+
+def resolve_pages(pages, path):
+    # Page numbers in a job spec list start at 1, like --pages. Open-ended
+    # ranges ("900-") need the page count of each file.
+    if not isinstance(pages, str):
+        return PageSelection.from_pages(page - 1 for page in pages)
+
+    ranges = parse_ranges(pages)
+    if any(stop is None for _, stop in ranges):
+        page_count = len(read_pdf(path).pages)
+    else:
+        page_count = max(stop for _, stop in ranges) if ranges else 0
+    return PageSelection.from_ranges(ranges, page_count)
+
+
+def parse_metadata(items):
+    metadata = {}
+    for item in items:
+        key, value = item.split("=", 1)
+        metadata[key if key.startswith("/") else "/" + key] = value
+    return metadata
+
+
+def new_optimizer(job):
+    if not job["optimize"]:
+        return None
+    return OutputOptimizer(image_dpi=job["image_dpi"], image_quality=job["image_quality"])
+
+
+def run_operation(job, path, optimizer=None, output=None):
+    operation = job["operation"]
+    if operation in ("rotate", "reorder", "delete", "extract"):
+        job = dict(job, pages=resolve_pages(job["pages"], path))
+    if operation == "rotate":
+        output, _ = rotate_pdf(path, job["angle"], job["pages"], optimizer, job["incremental"], output)
+    elif operation == "reorder":
+        output, _ = reorder_pages(path, job["pages"], job["target"], optimizer, output)
+    elif operation == "delete":
+        output, _ = delete_pages(path, job["pages"], optimizer, output)
+    elif operation == "extract":
+        output, _ = extract_pages(path, job["pages"], optimizer, output)
+    elif operation == "unlock":
+        output = unlock_pdf(path, job["password"], optimizer, output)
+        if output is None:
+            raise ValueError("incorrect password")
+    elif operation == "metadata":
+        output = edit_metadata(path, job["metadata"], optimizer, job["incremental"], output)
+    else:
+        raise ValueError(f"unknown operation: {operation}")
+    return output
+
+
+def output_path_for(job, relative_path):
+    # Outputs keep the input's path below its glob root, so files with the
+    # same name in different directories do not overwrite each other.
+    base_name, _ = os.path.splitext(relative_path)
+    return os.path.join(job["output_dir"], f"{base_name}_{OUTPUT_SUFFIXES[job['operation']]}.pdf")
+
+
+def process_file(job, path, output_path):
+    started = time.perf_counter()
+    optimizer = new_optimizer(job)
+
+    os.makedirs(os.path.dirname(output_path) or ".", exist_ok=True)
+    try:
+        with open(output_path, "wb") as output_file:
+            run_operation(job, path, optimizer, output_file)
+    except Exception:
+        os.remove(output_path)
+        raise
+
+    return {
+        "input": path,
+        "output": output_path,
+        "seconds": time.perf_counter() - started,
+        "input_bytes": os.path.getsize(path),
+        "output_bytes": os.path.getsize(output_path),
+        "optimize_seconds": optimizer.report["seconds"] if optimizer is not None else 0,
+    }
+
+
+def glob_root(pattern):
+    # The leading directories of pattern that contain no wildcards.
+    root = []
+    for part in os.path.normpath(pattern).split(os.sep)[:-1]:
+        if any(char in part for char in "*?["):
+            break
+        root.append(part)
+    return os.sep.join(root) or ("." if not os.path.isabs(pattern) else os.sep)
+
+
+def expand_inputs(patterns):
+    # (path, path relative to its pattern's glob root) for every input.
+    inputs = []
+    for pattern in patterns:
+        matches = sorted(glob.glob(pattern, recursive=True))
+        if not matches:
+            inputs.append((pattern, os.path.basename(pattern)))
+            continue
+        root = glob_root(pattern)
+        inputs.extend((match, os.path.relpath(match, root)) for match in matches)
+    return inputs
+
+
+def load_job(args):
+    job = {}
+    if args.job:
+        with open(args.job, encoding="utf-8") as job_file:
+            job.update(json.load(job_file))
+        if isinstance(job.get("inputs"), str):
+            job["inputs"] = [job["inputs"]]
+
+    for key in ("operation", "angle", "target", "password", "output_dir", "workers", "image_dpi", "image_quality"):
+        value = getattr(args, key)
+        if value is not None:
+            job[key] = value
+    if args.pages is not None:
+        job["pages"] = args.pages
+    if args.optimize:
+        job["optimize"] = True
+    if args.incremental:
+        job["incremental"] = True
+    if args.set:
+        job["metadata"] = parse_metadata(args.set)
+    if args.inputs:
+        job["inputs"] = args.inputs
+
+    apply_job_defaults(job)
+    try:
+        check_job(job)
+    except ValueError as e:
+        raise SystemExit(str(e))
+    if not job.get("inputs"):
+        raise SystemExit("no input files given")
+    return job
+
+
+def apply_job_defaults(job):
+    job.setdefault("pages", [])
+    job.setdefault("angle", 90)
+    job.setdefault("target", 0)
+    job.setdefault("password", "")
+    job.setdefault("metadata", {})
+    job.setdefault("output_dir", ".")
+    job.setdefault("workers", os.cpu_count() or 1)
+    job.setdefault("optimize", False)
+    job.setdefault("incremental", False)
+    job.setdefault("image_dpi", None)
+    job.setdefault("image_quality", None)
+    return job
+
+
+def check_job(job):
+    if job.get("operation") not in OPERATIONS:
+        raise ValueError(f"operation must be one of: {', '.join(OPERATIONS)}")
+    if isinstance(job["pages"], str):
+        parse_ranges(job["pages"])
+    elif not all(isinstance(page, int) and page >= 1 for page in job["pages"]):
+        raise ValueError("pages must be a range expression or a list of page numbers starting at 1")
+
+
+def run_merge(job, paths):
+    started = time.perf_counter()
+    output_path = os.path.join(job["output_dir"], "merged_pdfs.pdf")
+    optimizer = new_optimizer(job)
+    with open(output_path, "wb") as output_file:
+        deduplicated = merge_pdfs_to_file(paths, range(len(paths)), output_file, optimizer)
+    print(
+        f"Merged {len(paths)} files into {output_path} in {time.perf_counter() - started:.2f}s "
+        f"({deduplicated} duplicate objects shared)"
+    )
+    if optimizer is not None:
+        report = optimizer.report
+        print(f"Optimized: {report['bytes_saved'] / 1024 ** 2:.1f} MB saved in {report['seconds']:.2f}s")
+    return 0
+
+
+def run_batch(job, inputs):
+    started = time.perf_counter()
+    paths = [path for path, _ in inputs]
+    failures = []
+    total_bytes = 0
+    total_output_bytes = 0
+    optimize_seconds = 0
+
+    # Inputs that would still write the same output (the same relative path
+    # under two patterns) fail before anything runs.
+    output_paths = [output_path_for(job, relative_path) for _, relative_path in inputs]
+    counts = Counter(os.path.normcase(os.path.abspath(output_path)) for output_path in output_paths)
+    runnable = []
+    for path, output_path in zip(paths, output_paths):
+        if counts[os.path.normcase(os.path.abspath(output_path))] > 1:
+            failures.append((path, ValueError(f"another input also writes {output_path}")))
+            print(f"FAILED {path}: another input also writes {output_path}", file=sys.stderr, flush=True)
+        else:
+            runnable.append((path, output_path))
+
+    with ProcessPoolExecutor(max_workers=job["workers"]) as executor:
+        futures = {executor.submit(process_file, job, path, output_path): path for path, output_path in runnable}
+        for done, future in enumerate(as_completed(futures), start=1):
+            path = futures[future]
+            try:
+                result = future.result()
+            except Exception as e:
+                failures.append((path, e))
+                print(f"[{done}/{len(runnable)}] FAILED {path}: {e}", file=sys.stderr, flush=True)
+                continue
+
+            total_bytes += result["input_bytes"]
+            total_output_bytes += result["output_bytes"]
+            optimize_seconds += result["optimize_seconds"]
+            throughput = result["input_bytes"] / result["seconds"] / 1024 ** 2 if result["seconds"] else 0
+            print(
+                f"[{done}/{len(runnable)}] {path} -> {result['output']} "
+                f"({result['seconds']:.2f}s, {throughput:.1f} MB/s)",
+                flush=True,
+            )
+
+    elapsed = time.perf_counter() - started
+    succeeded = len(paths) - len(failures)
+    print(
+        f"{succeeded} succeeded, {len(failures)} failed in {elapsed:.2f}s "
+        f"({succeeded / elapsed if elapsed else 0:.1f} files/s, {total_bytes / elapsed / 1024 ** 2 if elapsed else 0:.1f} MB/s)"
+    )
+    if job["optimize"]:
+        print(f"Optimized: {(total_bytes - total_output_bytes) / 1024 ** 2:.1f} MB saved in {optimize_seconds:.2f}s")
+    return 1 if failures else 0
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog="pdf-editor", description="Run PDF Editor operations on many files.")
+    parser.add_argument("operation", nargs="?", choices=OPERATIONS)
+    parser.add_argument("inputs", nargs="*", help="input files or glob patterns")
+    parser.add_argument("--job", help="JSON job spec with the same keys as the options below")
+    parser.add_argument("--pages", help="page selection, e.g. 1,3,5-7 or 10- for page 10 to the end")
+    parser.add_argument("--angle", type=int, choices=[90, 180, 270], help="rotation angle")
+    parser.add_argument("--target", type=int, help="page after which reordered pages are inserted (0 for the start)")
+    parser.add_argument("--password", help="password for unlock")
+    parser.add_argument("--set", action="append", metavar="KEY=VALUE", help="metadata entry, may be repeated")
+    parser.add_argument("--output-dir", dest="output_dir", help="directory for output files")
+    parser.add_argument("--workers", type=int, help="number of worker processes")
+    parser.add_argument(
+        "--incremental", action="store_true", help="for rotate and metadata, append the changes to the original file instead of rewriting it"
+    )
+    parser.add_argument("--optimize", action="store_true", help="compress streams, merge identical objects and drop orphans")
+    parser.add_argument("--image-dpi", dest="image_dpi", type=int, help="with --optimize, downsample images to this DPI")
+    parser.add_argument("--image-quality", dest="image_quality", type=int, help="with --optimize, re-encode images as JPEG at this quality")
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    job = load_job(args)
+    inputs = expand_inputs(job["inputs"])
+    os.makedirs(job["output_dir"], exist_ok=True)
+
+    if job["operation"] == "merge":
+        return run_merge(job, [path for path, _ in inputs])
+    return run_batch(job, inputs)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
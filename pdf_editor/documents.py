@@ -0,0 +1,212 @@
+from collections import OrderedDict
+import hashlib
+from io import BytesIO
+import math
+import os
+import shutil
+import tempfile
+import threading
+import weakref
+
+from PIL import Image
+
+from pdf_editor.instrumentation import span
+from pdf_editor.page_plan import PagePlan
+from pdf_editor.render_engine import release_pdfium_files
+from pdf_editor.spool import spool_upload
+from pdf_editor.text_index import release_index_files
+
+HASH_CHUNK_SIZE = 1024 * 1024
+
+# Artifacts that can be rebuilt from the upload and the page plan, and are
+# dropped first from documents not in use when the disk budget is short. Each
+# is a (key, path, optimizer) tuple whose file is in the spool directory.
+REBUILDABLE_ARTIFACTS = ("output", "split")
+
+_stores = weakref.WeakSet()
+_stores_lock = threading.Lock()
+
+
+def upload_fingerprint(uploaded_file):
+    # Streamlit gives every upload a unique file_id; anything else is hashed
+    # in chunks from its buffer without copying it.
+    file_id = getattr(uploaded_file, "file_id", None)
+    if file_id:
+        return file_id
+
+    buffer = uploaded_file.getbuffer()
+    with span("fingerprint", bytes_in=len(buffer)):
+        digest = hashlib.sha256()
+        for offset in range(0, len(buffer), HASH_CHUNK_SIZE):
+            digest.update(buffer[offset:offset + HASH_CHUNK_SIZE])
+        return digest.hexdigest()
+
+
+def artifact_nbytes(value, seen):
+    if id(value) in seen:
+        return 0
+    seen.add(id(value))
+
+    if isinstance(value, (bytes, bytearray)):
+        return len(value)
+    if isinstance(value, BytesIO):
+        return value.getbuffer().nbytes
+    if isinstance(value, Image.Image):
+        return value.width * value.height * len(value.getbands())
+    if isinstance(value, PagePlan):
+        return artifact_nbytes(value.sources, seen)
+    if isinstance(value, dict):
+        return sum(artifact_nbytes(item, seen) for item in value.values())
+    if isinstance(value, (list, tuple)):
+        return sum(artifact_nbytes(item, seen) for item in value)
+    return 0
+
+
+def file_nbytes(path):
+    # A spool file can be replaced or removed by another run while the
+    # directory is being measured.
+    try:
+        return os.path.getsize(path)
+    except OSError:
+        return 0
+
+
+def process_nbytes():
+    with _stores_lock:
+        stores = list(_stores)
+    return sum(store.nbytes() for store in stores)
+
+
+class DocumentStore:
+    # Per-session owner of everything derived from an upload: the preview and
+    # page plan, prepared outputs, and so on, keyed by upload fingerprint.
+    # Documents opened during the current script run are pinned and keep
+    # everything; the rest are evicted least recently used first when the
+    # session or the whole process goes over its memory budget, or the session
+    # over its disk budget. Uploads and prepared outputs live as files in a
+    # private spool directory, which is removed with the store; only those
+    # files count towards the disk budget.
+
+    def __init__(self, session_budget, process_budget, disk_budget, spool_dir=None):
+        self.session_budget = session_budget
+        self.process_budget = process_budget
+        self.disk_budget = disk_budget
+        self.evictions = 0
+
+        if spool_dir:
+            os.makedirs(spool_dir, exist_ok=True)
+        self.spool_dir = tempfile.mkdtemp(prefix="pdf_editor_session_", dir=spool_dir)
+        weakref.finalize(self, shutil.rmtree, self.spool_dir, True)
+
+        self._lock = threading.RLock()
+        self._documents = OrderedDict()
+        self._pinned = set()
+        self._pending_removals = set()
+
+        with _stores_lock:
+            _stores.add(self)
+
+    def begin_run(self):
+        with self._lock:
+            self._pinned.clear()
+
+    def document(self, fingerprint):
+        with self._lock:
+            document = self._documents.setdefault(fingerprint, {})
+            self._documents.move_to_end(fingerprint)
+            self._pinned.add(fingerprint)
+            return document
+
+    def spool(self, fingerprint, uploaded_file):
+        document = self.document(fingerprint)
+        if "path" not in document:
+            document["path"] = spool_upload(uploaded_file, self.spool_path(f"{fingerprint}.pdf"))
+        return document["path"]
+
+    def spool_path(self, name):
+        path = os.path.join(self.spool_dir, name)
+        with self._lock:
+            # A file that could not be removed yet is about to be used again.
+            self._pending_removals.discard(path)
+        return path
+
+    def discard(self, fingerprint):
+        with self._lock:
+            if self._documents.pop(fingerprint, None) is not None:
+                self.evictions += 1
+            self._remove_files([
+                entry.path for entry in os.scandir(self.spool_dir)
+                if entry.name == f"{fingerprint}.pdf" or entry.name.startswith(f"{fingerprint}_")
+            ])
+
+    def _remove_files(self, paths):
+        # Renderer and text index workers may still have the files open, and
+        # Windows will not delete an open file. The workers are asked to close
+        # them, and what cannot be removed yet is tried again on later runs.
+        if not paths:
+            return
+        release_pdfium_files(paths)
+        release_index_files(paths)
+        for path in paths:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            except OSError:
+                self._pending_removals.add(path)
+
+    def spool_nbytes(self):
+        return sum(file_nbytes(entry.path) for entry in os.scandir(self.spool_dir) if entry.is_file())
+
+    def nbytes(self):
+        with self._lock:
+            seen = set()
+            return sum(artifact_nbytes(document, seen) for document in self._documents.values())
+
+    def stats(self):
+        # Other stores are measured after this one's lock is released, so two
+        # sessions asking at once cannot each wait on the other's lock.
+        with self._lock:
+            stats = {
+                "documents": len(self._documents),
+                "session_bytes": self.nbytes(),
+                "spool_bytes": self.spool_nbytes(),
+                "evictions": self.evictions,
+            }
+        stats["process_bytes"] = process_nbytes()
+        return stats
+
+    def enforce_budget(self):
+        with self._lock:
+            pending = list(self._pending_removals)
+            self._pending_removals.clear()
+            self._remove_files(pending)
+
+        self._shrink(self.session_budget, self.disk_budget)
+
+        if process_nbytes() > self.process_budget:
+            with _stores_lock:
+                stores = list(_stores)
+            for store in sorted(stores, key=lambda store: store.nbytes(), reverse=True):
+                store._shrink(0, math.inf)
+                if process_nbytes() <= self.process_budget:
+                    break
+
+    def _shrink(self, memory_budget, disk_budget):
+        with self._lock:
+            unpinned = [fingerprint for fingerprint in self._documents if fingerprint not in self._pinned]
+
+            # Prepared outputs only take disk space and can be rebuilt, so
+            # they go before whole documents.
+            for fingerprint in unpinned:
+                if self.spool_nbytes() <= disk_budget:
+                    break
+                document = self._documents[fingerprint]
+                paths = [document.pop(name)[1] for name in REBUILDABLE_ARTIFACTS if name in document]
+                self._remove_files(paths)
+                self.evictions += len(paths)
+
+            for fingerprint in unpinned:
+                if self.nbytes() <= memory_budget and self.spool_nbytes() <= disk_budget:
+                    return
+                self.discard(fingerprint)
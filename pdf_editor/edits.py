@@ -0,0 +1,41 @@
+from collections import namedtuple
+
+# order lists, for every output page, the position of the input page it comes
+# from (None keeps the order unchanged). rotations maps output positions to
+# the clockwise rotation added to that page.
+PageEdit = namedtuple("PageEdit", ["order", "rotations"])
+
+
+def rotation_edit(selected_pages, rotation_angle):
+    return PageEdit(None, {page_num: rotation_angle for page_num in selected_pages})
+
+
+def reorder_edit(page_count, selected_pages, target_page):
+    # The selected pages go, in selection order, right after the unselected
+    # page numbered target_page (1-based; 0 moves them to the front).
+    moved = list(selected_pages)
+    selected = set(moved)
+    before = [page_num for page_num in range(target_page) if page_num not in selected]
+    after = [page_num for page_num in range(target_page, page_count) if page_num not in selected]
+    return PageEdit(tuple(before + moved + after), {})
+
+
+def deletion_edit(page_count, selected_pages):
+    selected = set(selected_pages)
+    return PageEdit(tuple(page_num for page_num in range(page_count) if page_num not in selected), {})
+
+
+def extraction_edit(selected_pages):
+    return PageEdit(tuple(selected_pages), {})
+
+
+def apply_edit(items, edit, rotate):
+    if edit.order is None:
+        result = list(items)
+    else:
+        result = [items[page_num] for page_num in edit.order]
+
+    for position, rotation_angle in edit.rotations.items():
+        result[position] = rotate(result[position], rotation_angle)
+
+    return result
@@ -0,0 +1,168 @@
+from io import BytesIO
+import re
+import shutil
+import struct
+import zlib
+
+from pypdf.generic import (
+    ArrayObject, DictionaryObject, IndirectObject, NameObject, NumberObject, StreamObject, create_string_object
+)
+
+from pdf_editor.instrumentation import span
+
+XREF_STREAM_HEADER = re.compile(rb"\s*\d+\s+\d+\s+obj")
+
+
+def xref_kind(pdf_reader):
+    # "table" or "stream" for the last cross-reference section, None if the
+    # startxref pointer does not land on one (pypdf repaired the file).
+    stream = pdf_reader.stream
+    stream.seek(pdf_reader._startxref)
+    head = stream.read(32)
+    if head.startswith(b"xref"):
+        return "table"
+    if XREF_STREAM_HEADER.match(head):
+        return "stream"
+    return None
+
+
+def can_update(pdf_reader):
+    # Encrypted files would need every appended object encrypted as well.
+    return not pdf_reader.is_encrypted and xref_kind(pdf_reader) is not None
+
+
+def xref_subsections(numbers):
+    subsections = []
+    for number in sorted(numbers):
+        if subsections and subsections[-1][0] + len(subsections[-1][1]) == number:
+            subsections[-1][1].append(number)
+        else:
+            subsections.append((number, [number]))
+    return subsections
+
+
+class IncrementalUpdate:
+    # Appends changed objects and one new cross-reference section to the
+    # original bytes of an unencrypted PDF, leaving everything before them
+    # untouched. The cost is a copy of the original plus the size of the
+    # change, instead of parsing and rewriting every object.
+
+    def __init__(self, pdf_reader):
+        self.pdf_reader = pdf_reader
+        self._objects = {}
+        self._info = None
+        self._size = int(pdf_reader.trailer["/Size"])
+
+    def update_page(self, page):
+        reference = page.indirect_reference
+        self._objects[(reference.idnum, reference.generation)] = page
+
+    def set_metadata(self, metadata):
+        self._info = DictionaryObject({
+            NameObject(key): create_string_object(value) if isinstance(value, str) else value
+            for key, value in metadata.items()
+        })
+
+    def write(self, output):
+        source = self.pdf_reader.stream
+        source.seek(0)
+        start = output.tell()
+        shutil.copyfileobj(source, output)
+        output.write(b"\n")
+
+        trailer = DictionaryObject({
+            NameObject("/Root"): self.pdf_reader.trailer.raw_get("/Root"),
+            NameObject("/Prev"): NumberObject(self.pdf_reader._startxref),
+        })
+        for key in ("/Info", "/ID"):
+            if key in self.pdf_reader.trailer:
+                trailer[NameObject(key)] = self.pdf_reader.trailer.raw_get(key)
+
+        objects = dict(self._objects)
+        if self._info is not None:
+            info_number = self._allocate()
+            objects[(info_number, 0)] = self._info
+            trailer[NameObject("/Info")] = IndirectObject(info_number, 0, None)
+
+        offsets = {}
+        for (number, generation), value in sorted(objects.items()):
+            offsets[number] = (output.tell() - start, generation)
+            output.write(f"{number} {generation} obj\n".encode())
+            value.write_to_stream(output)
+            output.write(b"\nendobj\n")
+
+        if xref_kind(self.pdf_reader) == "stream":
+            self._write_xref_stream(output, start, offsets, trailer)
+        else:
+            self._write_xref_table(output, start, offsets, trailer)
+        return output
+
+    def _allocate(self):
+        number = self._size
+        self._size += 1
+        return number
+
+    def _write_xref_table(self, output, start, offsets, trailer):
+        xref_offset = output.tell() - start
+        output.write(b"xref\n0 1\n0000000000 65535 f \n")
+        for first, numbers in xref_subsections(offsets):
+            output.write(f"{first} {len(numbers)}\n".encode())
+            for number in numbers:
+                offset, generation = offsets[number]
+                output.write(f"{offset:010d} {generation:05d} n \n".encode())
+
+        trailer[NameObject("/Size")] = NumberObject(self._size)
+        output.write(b"trailer\n")
+        trailer.write_to_stream(output)
+        output.write(f"\nstartxref\n{xref_offset}\n%%EOF\n".encode())
+
+    def _write_xref_stream(self, output, start, offsets, trailer):
+        # The section of a file that uses cross-reference streams must be a
+        # stream too; it lists itself as well as the changed objects.
+        xref_number = self._allocate()
+        xref_offset = output.tell() - start
+        offsets[xref_number] = (xref_offset, 0)
+
+        index = ArrayObject()
+        rows = BytesIO()
+        for first, numbers in xref_subsections(offsets):
+            index.extend([NumberObject(first), NumberObject(len(numbers))])
+            for number in numbers:
+                offset, generation = offsets[number]
+                rows.write(struct.pack(">BQH", 1, offset, generation))
+
+        xref = StreamObject()
+        xref.update(trailer)
+        xref.update({
+            NameObject("/Type"): NameObject("/XRef"),
+            NameObject("/Size"): NumberObject(self._size),
+            NameObject("/Index"): index,
+            NameObject("/W"): ArrayObject([NumberObject(1), NumberObject(8), NumberObject(2)]),
+            NameObject("/Filter"): NameObject("/FlateDecode"),
+        })
+        xref._data = zlib.compress(rows.getvalue())
+
+        output.write(f"{xref_number} 0 obj\n".encode())
+        xref.write_to_stream(output)
+        output.write(f"\nendobj\nstartxref\n{xref_offset}\n%%EOF\n".encode())
+
+
+def update_pdf(pdf_reader, rotations=None, metadata=None, output=None):
+    output = BytesIO() if output is None else output
+    started = output.tell()
+    update = IncrementalUpdate(pdf_reader)
+
+    for page_num, angle in (rotations or {}).items():
+        page = pdf_reader.pages[page_num]
+        page.rotate(angle)
+        update.update_page(page)
+
+    if metadata is not None:
+        update.set_metadata(metadata)
+
+    with span("write", pages=len(update._objects)) as write_span:
+        update.write(output)
+        write_span.set(bytes_out=output.tell() - started)
+    if isinstance(output, BytesIO):
+        output.seek(0)
+    return output
@@ -0,0 +1,184 @@
+from collections import defaultdict
+import contextvars
+import json
+import logging
+import os
+import threading
+import time
+
+# Instrumentation is off unless PDF_EDITOR_INSTRUMENTATION is set; span()
+# then hands back a shared no-op object so instrumented code pays for one
+# function call and nothing else.
+ENABLED = os.environ.get("PDF_EDITOR_INSTRUMENTATION", "").lower() not in ("", "0", "false", "no")
+METRICS_FILE = os.environ.get("PDF_EDITOR_METRICS_FILE")
+LOG_FILE = os.environ.get("PDF_EDITOR_LOG_FILE")
+
+logger = logging.getLogger("pdf_editor.instrumentation")
+if ENABLED and not logger.handlers:
+    handler = logging.FileHandler(LOG_FILE) if LOG_FILE else logging.StreamHandler()
+    handler.setFormatter(logging.Formatter("%(message)s"))
+    logger.addHandler(handler)
+    logger.setLevel(logging.INFO)
+    logger.propagate = False
+
+STAGE_FIELDS = ("calls", "seconds", "bytes_in", "bytes_out", "pages")
+
+_totals = defaultdict(lambda: dict.fromkeys(STAGE_FIELDS, 0))
+_totals_lock = threading.Lock()
+_current_run = contextvars.ContextVar("pdf_editor_run", default=None)
+
+
+class Span:
+    __slots__ = ("name", "bytes_in", "bytes_out", "pages", "seconds", "_started")
+
+    def __init__(self, name, bytes_in=0, pages=0):
+        self.name = name
+        self.bytes_in = bytes_in
+        self.bytes_out = 0
+        self.pages = pages
+        self.seconds = 0.0
+
+    def set(self, bytes_in=None, bytes_out=None, pages=None):
+        if bytes_in is not None:
+            self.bytes_in = bytes_in
+        if bytes_out is not None:
+            self.bytes_out = bytes_out
+        if pages is not None:
+            self.pages = pages
+
+    def __enter__(self):
+        self._started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, traceback):
+        self.seconds = time.perf_counter() - self._started
+        record(self)
+        return False
+
+
+class NullSpan:
+    __slots__ = ()
+
+    def set(self, bytes_in=None, bytes_out=None, pages=None):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, traceback):
+        return False
+
+
+NULL_SPAN = NullSpan()
+
+
+def span(name, bytes_in=0, pages=0):
+    if not ENABLED:
+        return NULL_SPAN
+    return Span(name, bytes_in, pages)
+
+
+def record(finished):
+    with _totals_lock:
+        totals = _totals[finished.name]
+        totals["calls"] += 1
+        totals["seconds"] += finished.seconds
+        totals["bytes_in"] += finished.bytes_in
+        totals["bytes_out"] += finished.bytes_out
+        totals["pages"] += finished.pages
+
+    run_spans = _current_run.get()
+    if run_spans is not None:
+        run_spans.append(finished)
+
+    logger.info(json.dumps({
+        "event": "span",
+        "stage": finished.name,
+        "seconds": round(finished.seconds, 6),
+        "bytes_in": finished.bytes_in,
+        "bytes_out": finished.bytes_out,
+        "pages": finished.pages,
+    }))
+
+
+def submit_in_run(executor, func, *args):
+    # Worker threads do not inherit context variables; run func in a copy of
+    # the caller's context so its spans count towards the caller's rerun.
+    return executor.submit(contextvars.copy_context().run, func, *args)
+
+
+def begin_run(state, cache_stats):
+    if not ENABLED:
+        return
+
+    previous = state.get("perf_run")
+    if previous is not None and not previous["finished"]:
+        # The previous run ended early through st.rerun().
+        finish_run(state, previous, cache_stats)
+
+    run = {"spans": [], "cache_stats": dict(cache_stats), "started": time.perf_counter(), "finished": False}
+    state["perf_run"] = run
+    _current_run.set(run["spans"])
+
+
+def end_run(state, cache_stats):
+    if not ENABLED:
+        return
+
+    run = state.get("perf_run")
+    if run is not None and not run["finished"]:
+        finish_run(state, run, cache_stats)
+
+
+def finish_run(state, run, cache_stats):
+    run["finished"] = True
+
+    stages = defaultdict(lambda: dict.fromkeys(STAGE_FIELDS, 0))
+    for finished in run["spans"]:
+        stage = stages[finished.name]
+        stage["calls"] += 1
+        stage["seconds"] += finished.seconds
+        stage["bytes_in"] += finished.bytes_in
+        stage["bytes_out"] += finished.bytes_out
+        stage["pages"] += finished.pages
+
+    summary = {
+        "seconds": time.perf_counter() - run["started"],
+        "cache_hits": cache_stats.get("hits", 0) - run["cache_stats"].get("hits", 0),
+        "cache_misses": cache_stats.get("misses", 0) - run["cache_stats"].get("misses", 0),
+        "stages": dict(stages),
+    }
+    state["perf_last_run"] = summary
+    logger.info(json.dumps({"event": "rerun", **summary}))
+
+    if METRICS_FILE:
+        write_metrics(METRICS_FILE, cache_stats)
+
+
+def prometheus_text(cache_stats):
+    with _totals_lock:
+        totals = {name: dict(values) for name, values in _totals.items()}
+
+    lines = []
+    for field in STAGE_FIELDS:
+        metric = f"pdf_editor_stage_{field}_total"
+        lines.append(f"# TYPE {metric} counter")
+        for name, values in sorted(totals.items()):
+            lines.append(f'{metric}{{stage="{name}"}} {values[field]}')
+
+    for key, value in sorted(cache_stats.items()):
+        metric = f"pdf_editor_render_cache_{key}"
+        kind = "gauge" if key.endswith("_bytes") else "counter"
+        if kind == "counter":
+            metric += "_total"
+        lines.append(f"# TYPE {metric} {kind}")
+        lines.append(f"{metric} {value}")
+
+    return "\n".join(lines) + "\n"
+
+
+def write_metrics(path, cache_stats):
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as metrics_file:
+        metrics_file.write(prometheus_text(cache_stats))
+    os.replace(tmp_path, path)
@@ -0,0 +1,174 @@
+from io import BytesIO
+
+from pypdf import PdfReader, PdfWriter
+
+from pdf_editor.edits import deletion_edit, extraction_edit, reorder_edit, rotation_edit
+from pdf_editor.incremental import can_update, update_pdf
+from pdf_editor.instrumentation import ENABLED, span
+from pdf_editor.spool import input_nbytes, open_source
+from pdf_editor.streaming_merge import StreamingPdfWriter
+
+
+def read_pdf(pdf_file):
+    with span("parse") as parse_span:
+        pdf_reader = PdfReader(open_source(pdf_file))
+        # Counting pages walks the whole page tree, which a caller that only
+        # wants the metadata never pays for unless a span is recording.
+        if ENABLED:
+            parse_span.set(bytes_in=source_nbytes(pdf_reader), pages=0 if pdf_reader.is_encrypted else len(pdf_reader.pages))
+    return pdf_reader
+
+
+def source_nbytes(pdf_reader):
+    return input_nbytes(pdf_reader.stream)
+
+
+def write_pdf(pdf_writer, optimizer=None, bytes_in=0, output=None):
+    # Writes to output (any binary file) if given, otherwise to a new BytesIO.
+    if optimizer is not None:
+        optimizer.begin(bytes_in)
+        optimizer.optimize_writer(pdf_writer)
+
+    output = BytesIO() if output is None else output
+    started = output.tell()
+    with span("write", pages=len(pdf_writer.pages)) as write_span:
+        pdf_writer.write(output)
+        write_span.set(bytes_out=output.tell() - started)
+
+    if optimizer is not None:
+        optimizer.finish(output.tell() - started)
+    if isinstance(output, BytesIO):
+        output.seek(0)
+    return output
+
+
+def merge_pdfs(pdf_list, merge_order, optimizer=None, output=None):
+    pdf_writer = PdfWriter()
+    bytes_in = 0
+    
+    for idx in merge_order:
+        pdf_file = pdf_list[idx]
+        pdf_reader = read_pdf(pdf_file)
+        bytes_in += source_nbytes(pdf_reader)
+        for page_num in range(len(pdf_reader.pages)):
+            pdf_writer.add_page(pdf_reader.pages[page_num])
+
+    return write_pdf(pdf_writer, optimizer, bytes_in, output)
+
+
+def merge_pdfs_to_file(pdf_list, merge_order, output_file, optimizer=None):
+    if optimizer is not None:
+        optimizer.begin(sum(input_nbytes(pdf_list[idx]) for idx in merge_order))
+
+    with span("write", pages=0) as write_span:
+        pdf_writer = StreamingPdfWriter(output_file, optimizer)
+
+        for idx in merge_order:
+            pdf_writer.add_document(pdf_list[idx])
+
+        pdf_writer.close()
+        write_span.set(pages=pdf_writer.page_count, bytes_out=pdf_writer.bytes_written)
+
+    if optimizer is not None:
+        optimizer.finish(pdf_writer.bytes_written, objects_removed=pdf_writer.deduplicated)
+    return pdf_writer.deduplicated
+
+
+def rotate_pdf(pdf_file, rotation_angle, selected_pages, optimizer=None, incremental=False, output=None):
+    pdf_reader = read_pdf(pdf_file)
+    edit = rotation_edit(selected_pages, rotation_angle)
+    if incremental and optimizer is None and can_update(pdf_reader):
+        rotations = {page_num: angle for page_num, angle in edit.rotations.items() if page_num < len(pdf_reader.pages)}
+        return update_pdf(pdf_reader, rotations=rotations, output=output), edit
+
+    pdf_writer = PdfWriter()
+    metadata = pdf_reader.metadata
+
+    for page_num, page in enumerate(pdf_reader.pages):
+        if page_num in edit.rotations:
+            page.rotate(edit.rotations[page_num])
+        pdf_writer.add_page(page)
+    
+    if metadata:
+        pdf_writer.add_metadata(metadata)
+    return write_pdf(pdf_writer, optimizer, source_nbytes(pdf_reader), output), edit
+
+
+def reorder_pages(pdf_file, selected_pages, target_page, optimizer=None, output=None):
+    pdf_reader = read_pdf(pdf_file)
+    pdf_writer = PdfWriter()
+    metadata = pdf_reader.metadata
+    edit = reorder_edit(len(pdf_reader.pages), selected_pages, target_page)
+
+    for page_num in edit.order:
+        pdf_writer.add_page(pdf_reader.pages[page_num])
+    
+    if metadata:
+        pdf_writer.add_metadata(metadata)
+    return write_pdf(pdf_writer, optimizer, source_nbytes(pdf_reader), output), edit
+
+
+def delete_pages(pdf_file, selected_pages, optimizer=None, output=None):
+    pdf_reader = read_pdf(pdf_file)
+    pdf_writer = PdfWriter()
+    metadata = pdf_reader.metadata
+    edit = deletion_edit(len(pdf_reader.pages), selected_pages)
+
+    for page_num in edit.order:
+        pdf_writer.add_page(pdf_reader.pages[page_num])
+    
+    if metadata:
+        pdf_writer.add_metadata(metadata)
+    return write_pdf(pdf_writer, optimizer, source_nbytes(pdf_reader), output), edit
+
+
+def extract_pages(pdf_file, selected_pages, optimizer=None, output=None):
+    pdf_reader = read_pdf(pdf_file)
+    pdf_writer = PdfWriter()
+    metadata = pdf_reader.metadata
+    edit = extraction_edit(selected_pages)
+
+    for page_num in edit.order:
+        pdf_writer.add_page(pdf_reader.pages[page_num])
+    
+    if metadata:
+        pdf_writer.add_metadata(metadata)
+    return write_pdf(pdf_writer, optimizer, source_nbytes(pdf_reader), output), edit
+
+
+def get_metadata(pdf_file):
+    pdf_reader = read_pdf(pdf_file)
+    return pdf_reader.metadata
+
+
+def keeps_metadata(metadata, new_metadata):
+    return all(key in new_metadata and str(new_metadata[key]) == str(value) for key, value in (metadata or {}).items())
+
+
+def edit_metadata(pdf_file, new_metadata, optimizer=None, incremental=False, output=None):
+    pdf_reader = read_pdf(pdf_file)
+    # An incremental update leaves the old information dictionary in the
+    # file, so it is only used when no earlier value is changed or removed.
+    if incremental and optimizer is None and can_update(pdf_reader) and keeps_metadata(pdf_reader.metadata, new_metadata):
+        return update_pdf(pdf_reader, metadata=new_metadata, output=output)
+
+    pdf_writer = PdfWriter()
+
+    for page in pdf_reader.pages:
+        pdf_writer.add_page(page)
+
+    pdf_writer.add_metadata(new_metadata)
+
+    return write_pdf(pdf_writer, optimizer, source_nbytes(pdf_reader), output)
+
+
+def unlock_pdf(pdf_file, password, optimizer=None, output=None):
+    pdf_reader = read_pdf(pdf_file)
+    if pdf_reader.is_encrypted and not pdf_reader.decrypt(password):
+        return None
+
+    pdf_writer = PdfWriter()
+    for page in pdf_reader.pages:
+        pdf_writer.add_page(page)
+
+    return write_pdf(pdf_writer, optimizer, source_nbytes(pdf_reader), output)
@@ -0,0 +1,169 @@
+from io import BytesIO
+import math
+import time
+import zlib
+
+from PIL import Image
+from pypdf.filters import _xobj_to_image
+from pypdf.generic import ArrayObject, EncodedStreamObject, IndirectObject, NameObject, NumberObject, StreamObject
+
+from pdf_editor.instrumentation import span
+
+DEFAULT_JPEG_QUALITY = 85
+POINTS_PER_INCH = 72
+
+# Entries that describe how image samples are encoded; they are replaced when
+# an image is re-encoded.
+IMAGE_ENCODING_KEYS = {"/Filter", "/DecodeParms", "/Decode", "/ColorSpace", "/BitsPerComponent", "/Width", "/Height", "/Length"}
+
+
+def page_image_side(page, image_dpi):
+    # Longest side, in pixels, of an image covering the whole page at image_dpi.
+    box = page.mediabox
+    return math.ceil(max(abs(box.width), abs(box.height)) / POINTS_PER_INCH * image_dpi)
+
+
+def image_references(resources, seen=None):
+    # Images drawn by a page, including those inside its form XObjects.
+    seen = set() if seen is None else seen
+    resources = resources.get_object() if resources is not None else None
+    if not resources or "/XObject" not in resources:
+        return
+
+    for reference in resources["/XObject"].values():
+        if not isinstance(reference, IndirectObject) or reference.idnum in seen:
+            continue
+        seen.add(reference.idnum)
+
+        xobject = reference.get_object()
+        if xobject.get("/Subtype") == "/Image":
+            yield reference
+        elif xobject.get("/Subtype") == "/Form":
+            yield from image_references(xobject.get("/Resources"), seen)
+
+
+def has_filter(stream, name):
+    filters = stream.get("/Filter")
+    return name in filters if isinstance(filters, ArrayObject) else filters == name
+
+
+class OutputOptimizer:
+    # Optional last stage of every write path. Unfiltered streams are Flate
+    # compressed, identical objects are merged and orphans dropped, and images
+    # can be downsampled so they are no sharper than image_dpi at full-page
+    # size and re-encoded as JPEG at image_quality. A re-encoded stream is
+    # only kept if it is smaller than the original.
+
+    def __init__(self, image_dpi=None, image_quality=None, compression_level=9):
+        self.image_dpi = image_dpi
+        self.image_quality = image_quality
+        self.compression_level = compression_level
+        self.report = None
+        self.begin(0)
+
+    def begin(self, bytes_in):
+        self.report = {
+            "bytes_in": bytes_in,
+            "bytes_out": 0,
+            "bytes_saved": 0,
+            "seconds": 0.0,
+            "streams_compressed": 0,
+            "images_recompressed": 0,
+            "objects_removed": 0,
+        }
+
+    def finish(self, bytes_out, objects_removed=0):
+        self.report["bytes_out"] = bytes_out
+        self.report["bytes_saved"] = self.report["bytes_in"] - bytes_out
+        self.report["objects_removed"] += objects_removed
+        return self.report
+
+    def add_report(self, report):
+        # Folds in the counts of an optimizer that ran elsewhere, such as in
+        # a worker process.
+        for key in ("seconds", "streams_compressed", "images_recompressed", "objects_removed"):
+            self.report[key] += report[key]
+
+    def optimize_writer(self, pdf_writer):
+        started = time.perf_counter()
+        with span("optimize", pages=len(pdf_writer.pages)):
+            image_sides = {}
+            if self.image_dpi:
+                for page in pdf_writer.pages:
+                    side = page_image_side(page, self.image_dpi)
+                    for reference in image_references(page.get("/Resources")):
+                        image_sides[reference.idnum] = max(image_sides.get(reference.idnum, 0), side)
+
+            for number, value in enumerate(pdf_writer._objects, start=1):
+                if isinstance(value, StreamObject):
+                    optimized = self._optimize_stream(value, image_sides.get(number))
+                    optimized.indirect_reference = value.indirect_reference
+                    pdf_writer._objects[number - 1] = optimized
+
+            objects_before = sum(value is not None for value in pdf_writer._objects)
+            pdf_writer.compress_identical_objects(remove_identicals=True, remove_orphans=True)
+            self.report["objects_removed"] += objects_before - sum(value is not None for value in pdf_writer._objects)
+        self.report["seconds"] += time.perf_counter() - started
+
+    def optimize_stream(self, stream, image_side=None):
+        started = time.perf_counter()
+        optimized = self._optimize_stream(stream, image_side)
+        self.report["seconds"] += time.perf_counter() - started
+        return optimized
+
+    def _optimize_stream(self, stream, image_side):
+        if stream.get("/Subtype") == "/Image" and (image_side or self.image_quality):
+            optimized = self._optimize_image(stream, image_side)
+            if optimized is not stream:
+                return optimized
+
+        if "/Filter" not in stream:
+            encoded = stream.flate_encode(self.compression_level)
+            if len(encoded._data) < len(stream._data):
+                self.report["streams_compressed"] += 1
+                return encoded
+        return stream
+
+    def _optimize_image(self, stream, image_side):
+        if stream.get("/ImageMask") or stream.get("/BitsPerComponent") == 1:
+            return stream
+
+        width, height = stream["/Width"], stream["/Height"]
+        scale = min(1, image_side / max(width, height)) if image_side else 1
+        if scale == 1 and not self.image_quality:
+            return stream
+
+        try:
+            _, _, image = _xobj_to_image(stream)
+        except Exception:
+            # Encodings Pillow cannot decode (JBIG2, some JPX) are left alone.
+            return stream
+
+        image = image.convert("L" if image.mode in ("L", "LA") else "RGB")
+        if scale < 1:
+            image = image.resize((max(1, round(width * scale)), max(1, round(height * scale))), Image.Resampling.LANCZOS)
+
+        if self.image_quality or has_filter(stream, "/DCTDecode"):
+            buffer = BytesIO()
+            image.save(buffer, format="JPEG", quality=self.image_quality or DEFAULT_JPEG_QUALITY)
+            data, image_filter = buffer.getvalue(), "/DCTDecode"
+        else:
+            data, image_filter = zlib.compress(image.tobytes(), self.compression_level), "/FlateDecode"
+
+        if len(data) >= len(stream._data):
+            return stream
+
+        optimized = EncodedStreamObject()
+        for key, value in stream.items():
+            if key not in IMAGE_ENCODING_KEYS and not (key == "/Mask" and isinstance(value, ArrayObject)):
+                optimized[NameObject(key)] = value
+        optimized.update({
+            NameObject("/Width"): NumberObject(image.width),
+            NameObject("/Height"): NumberObject(image.height),
+            NameObject("/ColorSpace"): NameObject("/DeviceGray" if image.mode == "L" else "/DeviceRGB"),
+            NameObject("/BitsPerComponent"): NumberObject(8),
+            NameObject("/Filter"): NameObject(image_filter),
+        })
+        optimized._data = data
+        self.report["images_recompressed"] += 1
+        return optimized
@@ -0,0 +1,93 @@
+from collections import namedtuple
+
+from pypdf import PdfReader, PdfWriter
+
+from pdf_editor.edits import apply_edit
+from pdf_editor.incremental import can_update, update_pdf
+from pdf_editor.operations import write_pdf
+from pdf_editor.spool import input_nbytes, open_source
+
+MAX_UNDO = 100
+
+# One output page: the page_index-th page of the source document identified by
+# source, with rotation (clockwise, degrees) added on top of its own /Rotate.
+PlanPage = namedtuple("PlanPage", ["source", "page_index", "rotation"])
+
+
+def rotate_plan_page(plan_page, rotation_angle):
+    return plan_page._replace(rotation=(plan_page.rotation + rotation_angle) % 360)
+
+
+class PagePlan:
+    # Edits only rewrite the list of PlanPage records; the PDF is serialized
+    # from the untouched sources when write() is called. Undo and redo keep
+    # snapshots of the record list instead of PDF copies.
+
+    def __init__(self, sources, pages, metadata_source=None):
+        self.sources = sources
+        self.pages = list(pages)
+        self.metadata_source = metadata_source
+        self._undo = []
+        self._redo = []
+        self.version = 0
+
+    @classmethod
+    def from_document(cls, source, pdf_source, page_count):
+        pages = [PlanPage(source, page_index, 0) for page_index in range(page_count)]
+        return cls({source: pdf_source}, pages, metadata_source=source)
+
+    def apply(self, edit):
+        self._undo.append(tuple(self.pages))
+        del self._undo[:-MAX_UNDO]
+        self._redo.clear()
+        self.pages = apply_edit(self.pages, edit, rotate_plan_page)
+        self.version += 1
+
+    def can_undo(self):
+        return bool(self._undo)
+
+    def can_redo(self):
+        return bool(self._redo)
+
+    def undo(self):
+        self._redo.append(tuple(self.pages))
+        self.pages = list(self._undo.pop())
+        self.version += 1
+
+    def redo(self):
+        self._undo.append(tuple(self.pages))
+        self.pages = list(self._redo.pop())
+        self.version += 1
+
+    def write(self, optimizer=None, incremental=False, output=None):
+        if incremental and optimizer is None:
+            written = self._write_incremental(output)
+            if written is not None:
+                return written
+
+        pdf_readers = {}
+        pdf_writer = PdfWriter()
+
+        for plan_page in self.pages:
+            if plan_page.source not in pdf_readers:
+                pdf_readers[plan_page.source] = PdfReader(open_source(self.sources[plan_page.source]))
+            page = pdf_writer.add_page(pdf_readers[plan_page.source].pages[plan_page.page_index])
+            if plan_page.rotation:
+                page.rotate(plan_page.rotation)
+
+        if self.metadata_source in pdf_readers and pdf_readers[self.metadata_source].metadata:
+            pdf_writer.add_metadata(pdf_readers[self.metadata_source].metadata)
+
+        bytes_in = sum(input_nbytes(self.sources[source]) for source in pdf_readers)
+        return write_pdf(pdf_writer, optimizer, bytes_in, output)
+
+    def _write_incremental(self, output):
+        # Only a plan that keeps every page of one document in place, with
+        # rotations at most, can be appended to the original bytes.
+        pdf_reader = PdfReader(open_source(self.sources[self.metadata_source]))
+        if not can_update(pdf_reader):
+            return None
+        if [plan_page[:2] for plan_page in self.pages] != [(self.metadata_source, i) for i in range(len(pdf_reader.pages))]:
+            return None
+        rotations = {plan_page.page_index: plan_page.rotation for plan_page in self.pages if plan_page.rotation}
+        return update_pdf(pdf_reader, rotations=rotations, output=output)
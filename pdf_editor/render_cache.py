@@ -0,0 +1,226 @@
+from collections import OrderedDict
+import os
+import tempfile
+import threading
+
+from PIL import Image
+
+from pdf_editor.render_engine import render_ranges
+from pdf_editor.spool import document_digest
+
+DEFAULT_CACHE_DIR = os.path.join(tempfile.gettempdir(), "pdf_editor_cache")
+DEFAULT_DPI = 200
+
+
+def contiguous_ranges(page_indices):
+    ranges = []
+    for page_index in sorted(set(page_indices)):
+        if ranges and ranges[-1][1] == page_index - 1:
+            ranges[-1][1] = page_index
+        else:
+            ranges.append([page_index, page_index])
+    return [tuple(page_range) for page_range in ranges]
+
+
+def image_nbytes(image):
+    return image.width * image.height * len(image.getbands())
+
+
+class RenderCache:
+    # Rendered pages keyed by (document digest, page index, dpi, color mode).
+    # The memory tier is an LRU bounded by decoded image size; the disk tier
+    # stores PNGs in cache_dir and evicts the least recently used files once
+    # max_disk_bytes is exceeded. One instance is shared by every session.
+
+    def __init__(self, cache_dir=DEFAULT_CACHE_DIR, max_memory_bytes=256 * 1024 ** 2, max_disk_bytes=2 * 1024 ** 3):
+        self.cache_dir = cache_dir
+        self.max_memory_bytes = max_memory_bytes
+        self.max_disk_bytes = max_disk_bytes
+
+        self._lock = threading.RLock()
+        self._memory = OrderedDict()
+        self._memory_bytes = 0
+
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        os.makedirs(cache_dir, exist_ok=True)
+        self._disk_bytes = sum(entry.stat().st_size for entry in os.scandir(cache_dir) if entry.name.endswith(".png"))
+
+    def get_page(self, pdf_source, page_index, dpi=DEFAULT_DPI, grayscale=False, digest=None):
+        return self.get_pages(pdf_source, [page_index], dpi=dpi, grayscale=grayscale, digest=digest)[0]
+
+    def get_pages(self, pdf_source, page_indices, dpi=DEFAULT_DPI, grayscale=False, digest=None):
+        return [image for _, image in self.iter_pages(pdf_source, page_indices, dpi=dpi, grayscale=grayscale, digest=digest)]
+
+    def iter_pages(self, pdf_source, page_indices, dpi=DEFAULT_DPI, grayscale=False, digest=None):
+        # Yields (page_index, image) in the requested order. Cached pages come
+        # back immediately; missing ones are rendered concurrently by the
+        # render engine and yielded as soon as their turn comes.
+        digest = digest or document_digest(pdf_source)
+        mode = "L" if grayscale else "RGB"
+        page_indices = list(page_indices)
+
+        cached = {}
+        missing = []
+        for page_index in page_indices:
+            image = self._lookup((digest, page_index, dpi, mode))
+            if image is None:
+                missing.append(page_index)
+            else:
+                cached[page_index] = image
+
+        rendered = render_ranges(pdf_source, contiguous_ranges(missing), dpi, grayscale=grayscale, digest=digest)
+        try:
+            for page_index in page_indices:
+                if page_index not in cached:
+                    for rendered_index, image in rendered:
+                        self._store((digest, rendered_index, dpi, mode), image)
+                        cached[rendered_index] = image
+                        if rendered_index == page_index:
+                            break
+                yield page_index, cached[page_index]
+        finally:
+            rendered.close()
+
+    def stats(self):
+        with self._lock:
+            return {
+                "hits": self.memory_hits + self.disk_hits,
+                "memory_hits": self.memory_hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "memory_bytes": self._memory_bytes,
+                "disk_bytes": self._disk_bytes,
+            }
+
+    def clear(self):
+        with self._lock:
+            self._memory.clear()
+            self._memory_bytes = 0
+            for entry in os.scandir(self.cache_dir):
+                if entry.name.endswith(".png"):
+                    os.remove(entry.path)
+            self._disk_bytes = 0
+
+    def _path(self, key):
+        digest, page_index, dpi, mode = key
+        return os.path.join(self.cache_dir, f"{digest}_{page_index}_{dpi}_{mode}.png")
+
+    def _lookup(self, key):
+        with self._lock:
+            image = self._memory.get(key)
+            if image is not None:
+                self._memory.move_to_end(key)
+                self.memory_hits += 1
+                return image
+
+        path = self._path(key)
+        try:
+            with Image.open(path) as stored:
+                image = stored.copy()
+            os.utime(path)
+        except (FileNotFoundError, OSError):
+            with self._lock:
+                self.misses += 1
+            return None
+
+        with self._lock:
+            self.disk_hits += 1
+            self._remember(key, image)
+        return image
+
+    def _store(self, key, image):
+        with self._lock:
+            self._remember(key, image)
+
+        path = self._path(key)
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        image.save(tmp_path, format="PNG", compress_level=1)
+        size = os.path.getsize(tmp_path)
+        os.replace(tmp_path, path)
+
+        with self._lock:
+            self._disk_bytes += size
+            if self._disk_bytes > self.max_disk_bytes:
+                self._evict_disk()
+
+    def _remember(self, key, image):
+        if key in self._memory:
+            self._memory_bytes -= image_nbytes(self._memory.pop(key))
+        self._memory[key] = image
+        self._memory_bytes += image_nbytes(image)
+
+        while self._memory_bytes > self.max_memory_bytes and len(self._memory) > 1:
+            _, evicted = self._memory.popitem(last=False)
+            self._memory_bytes -= image_nbytes(evicted)
+            self.evictions += 1
+
+    def _evict_disk(self):
+        entries = [entry for entry in os.scandir(self.cache_dir) if entry.name.endswith(".png")]
+        entries.sort(key=lambda entry: entry.stat().st_mtime)
+
+        self._disk_bytes = sum(entry.stat().st_size for entry in entries)
+        for entry in entries:
+            if self._disk_bytes <= self.max_disk_bytes:
+                break
+            try:
+                size = entry.stat().st_size
+                os.remove(entry.path)
+            except FileNotFoundError:
+                continue
+            self._disk_bytes -= size
+            self.evictions += 1
+
+
+class ThumbnailCache:
+    # Encoded thumbnails keyed by (document digest, page index, rotation,
+    # thumbnail size), kept in memory as compressed bytes in LRU order. A
+    # thumbnail is a few kilobytes, so a few thousand fit where one window of
+    # decoded renders would.
+
+    def __init__(self, max_bytes=64 * 1024 ** 2):
+        self.max_bytes = max_bytes
+
+        self._lock = threading.Lock()
+        self._thumbnails = OrderedDict()
+        self._bytes = 0
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key):
+        with self._lock:
+            data = self._thumbnails.get(key)
+            if data is None:
+                self.misses += 1
+                return None
+            self._thumbnails.move_to_end(key)
+            self.hits += 1
+            return data
+
+    def put(self, key, data):
+        with self._lock:
+            if key in self._thumbnails:
+                self._bytes -= len(self._thumbnails.pop(key))
+            self._thumbnails[key] = data
+            self._bytes += len(data)
+
+            while self._bytes > self.max_bytes and len(self._thumbnails) > 1:
+                _, evicted = self._thumbnails.popitem(last=False)
+                self._bytes -= len(evicted)
+                self.evictions += 1
+
+    def stats(self):
+        with self._lock:
+            return {
+                "thumbnails": len(self._thumbnails),
+                "thumbnail_hits": self.hits,
+                "thumbnail_misses": self.misses,
+                "thumbnail_evictions": self.evictions,
+                "thumbnail_bytes": self._bytes,
+            }
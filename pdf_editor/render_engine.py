@@ -0,0 +1,202 @@
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, wait
+import math
+import multiprocessing
+import os
+import tempfile
+import threading
+
+from pdf2image import convert_from_path
+
+from pdf_editor.instrumentation import span, submit_in_run
+from pdf_editor.spool import document_digest, is_path
+
+try:
+    import pypdfium2 as pdfium
+except ImportError:
+    pdfium = None
+
+RENDER_WORKERS = max(1, os.cpu_count() or 1)
+MAX_PAGES_PER_TASK = 8
+MAX_OPEN_DOCUMENTS = 8
+
+_page_executor = ThreadPoolExecutor(max_workers=RENDER_WORKERS, thread_name_prefix="pdf_editor_render")
+_document_executor = ThreadPoolExecutor(max_workers=RENDER_WORKERS, thread_name_prefix="pdf_editor_document")
+_pdfium_executor = None
+_pdfium_executor_lock = threading.Lock()
+_worker_documents = OrderedDict()
+
+
+def split_range(first, last, pages_per_task):
+    return [(start, min(start + pages_per_task - 1, last)) for start in range(first, last + 1, pages_per_task)]
+
+
+def plan_tasks(page_ranges):
+    page_total = sum(last - first + 1 for first, last in page_ranges)
+    pages_per_task = max(1, min(MAX_PAGES_PER_TASK, math.ceil(page_total / RENDER_WORKERS)))
+
+    tasks = []
+    for first, last in page_ranges:
+        tasks.extend(split_range(first, last, pages_per_task))
+    return tasks
+
+
+class PopplerRenderer:
+    # Renders through pdf2image: each task runs its own pdftoppm process on
+    # the file, so a thread pool is enough to keep every core busy. A PDF
+    # given as bytes is written to a temporary file once per call first.
+    name = "poppler"
+
+    def render_ranges(self, pdf_source, page_ranges, dpi, grayscale=False, digest=None):
+        tasks = plan_tasks(page_ranges)
+        if not tasks:
+            return
+
+        temporary = not is_path(pdf_source)
+        if temporary:
+            fd, path = tempfile.mkstemp(suffix=".pdf")
+        else:
+            path = pdf_source
+
+        futures = []
+        try:
+            if temporary:
+                with os.fdopen(fd, "wb") as pdf_file:
+                    pdf_file.write(pdf_source)
+
+            def render(task):
+                first, last = task
+                with span("rasterize", pages=last - first + 1):
+                    return convert_from_path(path, dpi=dpi, first_page=first + 1, last_page=last + 1, grayscale=grayscale)
+
+            if len(tasks) == 1:
+                results = [render(tasks[0])]
+            else:
+                futures = [submit_in_run(_page_executor, render, task) for task in tasks]
+                results = (future.result() for future in futures)
+
+            for (first, last), images in zip(tasks, results):
+                yield from zip(range(first, last + 1), images)
+        finally:
+            for future in futures:
+                future.cancel()
+            wait(futures)
+            if temporary:
+                os.remove(path)
+
+
+def render_pdfium_pages(pdf_source, digest, first, last, dpi, grayscale):
+    # Runs in a worker process, which keeps the documents it rendered most
+    # recently open, so a page costs one rasterization with no file or
+    # process start-up. PDFium reads a path through its own file access,
+    # paging in only what it needs.
+    if digest not in _worker_documents:
+        _worker_documents[digest] = (pdf_source, pdfium.PdfDocument(pdf_source))
+        while len(_worker_documents) > MAX_OPEN_DOCUMENTS:
+            _, (_, evicted) = _worker_documents.popitem(last=False)
+            evicted.close()
+    _worker_documents.move_to_end(digest)
+    document = _worker_documents[digest][1]
+
+    images = []
+    for page_index in range(first, last + 1):
+        page = document[page_index]
+        try:
+            images.append(page.render(scale=dpi / 72, grayscale=grayscale).to_pil())
+        finally:
+            page.close()
+    return images
+
+
+def close_pdfium_documents(paths):
+    # Runs in a worker process: closes the documents opened from files that
+    # are being removed, which Windows refuses to delete while they are open.
+    for digest, (pdf_source, document) in list(_worker_documents.items()):
+        if is_path(pdf_source) and pdf_source in paths:
+            del _worker_documents[digest]
+            document.close()
+
+
+def pdfium_executor():
+    # PDFium is not thread-safe, so pages are rendered in spawned worker
+    # processes, one per core and shared by every session.
+    global _pdfium_executor
+    with _pdfium_executor_lock:
+        if _pdfium_executor is None:
+            _pdfium_executor = ProcessPoolExecutor(max_workers=RENDER_WORKERS, mp_context=multiprocessing.get_context("spawn"))
+        return _pdfium_executor
+
+
+def shutdown_pdfium_executor():
+    # A process that is itself a multiprocessing child waits for its own
+    # children before executors are shut down at exit, so it must stop the
+    # workers first.
+    global _pdfium_executor
+    with _pdfium_executor_lock:
+        if _pdfium_executor is not None:
+            _pdfium_executor.shutdown(cancel_futures=True)
+            _pdfium_executor = None
+
+
+def release_pdfium_files(paths):
+    # Asks every worker to close paths. There is no way to address a worker,
+    # so one task per worker is queued; a worker busy rendering may take two
+    # and leave another to close them on a later request.
+    with _pdfium_executor_lock:
+        if _pdfium_executor is not None:
+            for _ in range(RENDER_WORKERS):
+                _pdfium_executor.submit(close_pdfium_documents, tuple(paths))
+
+
+class PdfiumRenderer:
+    # Renders with pypdfium2 on a pool of worker processes, split into page
+    # ranges the same way as PopplerRenderer.
+    name = "pdfium"
+
+    def render_ranges(self, pdf_source, page_ranges, dpi, grayscale=False, digest=None):
+        tasks = plan_tasks(page_ranges)
+        if not tasks:
+            return
+
+        digest = digest or document_digest(pdf_source)
+        executor = pdfium_executor()
+        futures = [executor.submit(render_pdfium_pages, pdf_source, digest, first, last, dpi, grayscale) for first, last in tasks]
+        try:
+            for (first, last), future in zip(tasks, futures):
+                # Workers cannot record spans; this one times the wait for
+                # each range in page order.
+                with span("rasterize", pages=last - first + 1):
+                    images = future.result()
+                yield from zip(range(first, last + 1), images)
+        finally:
+            for future in futures:
+                future.cancel()
+
+
+RENDERERS = {"poppler": PopplerRenderer}
+if pdfium is not None:
+    RENDERERS["pdfium"] = PdfiumRenderer
+
+
+def select_renderer(name=None):
+    # "auto" prefers the in-process backend when pypdfium2 is installed.
+    name = name or os.environ.get("PDF_EDITOR_RENDERER", "auto")
+    if name == "auto":
+        name = "pdfium" if "pdfium" in RENDERERS else "poppler"
+    if name not in RENDERERS:
+        raise ValueError(f"unknown or unavailable renderer: {name} (available: {', '.join(RENDERERS)})")
+    return RENDERERS[name]()
+
+
+renderer = select_renderer()
+
+
+def render_ranges(pdf_source, page_ranges, dpi, grayscale=False, digest=None):
+    # Yields (page_index, image) in page order while later ranges are still
+    # rendering, so callers can display pages as soon as they are ready.
+    return renderer.render_ranges(pdf_source, page_ranges, dpi, grayscale=grayscale, digest=digest)
+
+
+def map_documents(func, items):
+    futures = [submit_in_run(_document_executor, func, item) for item in items]
+    return [future.result() for future in futures]
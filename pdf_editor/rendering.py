@@ -0,0 +1,132 @@
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+import math
+import threading
+
+from PIL import Image
+from pypdf import PdfReader
+
+from pdf_editor.instrumentation import span
+from pdf_editor.spool import input_nbytes, open_source
+
+DPI_STEP = 10
+THUMBNAIL_FORMAT = "JPEG"
+THUMBNAIL_QUALITY = 80
+
+_prefetch_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="pdf_editor_prefetch")
+_prefetch_lock = threading.Lock()
+_prefetch_pending = set()
+
+
+def page_longest_side(page):
+    box = page.mediabox
+    return max(float(box.width), float(box.height))
+
+
+def document_layout(pdf_source):
+    with span("parse", bytes_in=input_nbytes(pdf_source)) as parse_span:
+        pdf_reader = PdfReader(open_source(pdf_source))
+        longest_side = max((page_longest_side(page) for page in pdf_reader.pages), default=0)
+        parse_span.set(pages=len(pdf_reader.pages))
+    return len(pdf_reader.pages), longest_side
+
+
+def thumbnail_dpi(image_size, longest_side):
+    # Render just large enough for the longest page side to fill the thumbnail,
+    # rounded up so nearby slider values share cache entries.
+    if longest_side <= 0:
+        return DPI_STEP
+    dpi = image_size * 72 / longest_side
+    return max(DPI_STEP, math.ceil(dpi / DPI_STEP) * DPI_STEP)
+
+
+def page_window(window_index, window_size, page_count):
+    first = window_index * window_size
+    return range(first, min(first + window_size, page_count))
+
+
+def window_count(window_size, page_count):
+    return max(1, math.ceil(page_count / window_size))
+
+
+def neighbour_windows(window_index, window_size, page_count):
+    return [
+        page_window(neighbour, window_size, page_count)
+        for neighbour in (window_index + 1, window_index - 1)
+        if 0 <= neighbour < window_count(window_size, page_count)
+    ]
+
+
+def prefetch(render_cache, pdf_source, page_indices, dpi, digest):
+    page_indices = tuple(page_indices)
+    key = (digest, page_indices, dpi)
+    with _prefetch_lock:
+        if key in _prefetch_pending:
+            return
+        _prefetch_pending.add(key)
+
+    def run():
+        try:
+            render_cache.get_pages(pdf_source, page_indices, dpi=dpi, digest=digest)
+        finally:
+            with _prefetch_lock:
+                _prefetch_pending.discard(key)
+
+    _prefetch_executor.submit(run)
+
+
+def rotate_thumbnail(image, rotation):
+    if not rotation:
+        return image
+    return image.rotate(-rotation, expand=True)
+
+
+def encode_thumbnail(image, rotation, size, image_format=THUMBNAIL_FORMAT, quality=THUMBNAIL_QUALITY):
+    # Rotates and letterboxes a render into a size x size square in one pass
+    # and returns it compressed. The render is shrunk first, with reduce()
+    # doing the bulk of the downscale, so the rotation and the paste only
+    # touch thumbnail-sized pixels.
+    with span("thumbnail", pages=1) as thumbnail_span:
+        width, height = image.size
+        if rotation % 180:
+            width, height = height, width
+        scale = min(size / width, size / height)
+        new_width, new_height = max(1, int(width * scale)), max(1, int(height * scale))
+
+        resized = (new_height, new_width) if rotation % 180 else (new_width, new_height)
+        small = rotate_thumbnail(image.resize(resized, Image.Resampling.BILINEAR, reducing_gap=2.0), rotation)
+
+        canvas = Image.new("RGB", (size, size), (0, 0, 0))
+        canvas.paste(small.convert("RGB"), ((size - new_width) // 2, (size - new_height) // 2))
+
+        buffer = BytesIO()
+        canvas.save(buffer, format=image_format, quality=quality)
+        thumbnail_span.set(bytes_out=buffer.tell())
+        return buffer.getvalue()
+
+
+def resize_and_add_black_border(img, target_width, target_height):
+    with span("thumbnail", pages=1):
+        return letterbox(img, target_width, target_height)
+
+
+def letterbox(img, target_width, target_height):
+    original_width, original_height = img.size
+
+    aspect_ratio = original_width / original_height
+
+    if target_width / target_height > aspect_ratio:
+        new_height = target_height
+        new_width = int(target_height * aspect_ratio)
+    else:
+        new_width = target_width
+        new_height = int(target_width / aspect_ratio)
+
+    img = img.resize((new_width, new_height))
+
+    new_image = Image.new("RGB", (target_width, target_height), (0, 0, 0))
+    offset_x = (target_width - new_width) // 2
+    offset_y = (target_height - new_height) // 2
+    new_image.paste(img, (offset_x, offset_y))
+
+    return new_image
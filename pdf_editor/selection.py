@@ -0,0 +1,93 @@
+import re
+
+RUN_OF_PAGES = re.compile("1+")
+
+
+def parse_ranges(text):
+    # "1-500, 702, 900-" -> [(0, 500), (701, 702), (899, None)]: 0-based
+    # half-open ranges, with None for a range that runs to the last page.
+    ranges = []
+    for part in text.replace(" ", "").split(","):
+        if not part:
+            continue
+
+        first, dash, last = part.partition("-")
+        try:
+            start = int(first) - 1 if first else 0
+            stop = (int(last) if last else None) if dash else start + 1
+        except ValueError:
+            raise ValueError(f"Invalid page range: {part!r}") from None
+        if start < 0 or (stop is not None and stop <= start):
+            raise ValueError(f"Invalid page range: {part!r}")
+
+        ranges.append((start, stop))
+    return ranges
+
+
+class PageSelection:
+    # A set of 0-based page positions kept as the bits of one int, so
+    # membership is a shift, selecting a range is a mask and iteration is in
+    # page order whatever order the pages were picked in.
+
+    def __init__(self, bits=0):
+        self.bits = bits
+
+    @classmethod
+    def from_ranges(cls, ranges, page_count):
+        bits = 0
+        for start, stop in ranges:
+            stop = page_count if stop is None else min(stop, page_count)
+            if start < stop:
+                bits |= ((1 << (stop - start)) - 1) << start
+        return cls(bits)
+
+    @classmethod
+    def parse(cls, text, page_count):
+        return cls.from_ranges(parse_ranges(text), page_count)
+
+    @classmethod
+    def from_pages(cls, pages):
+        bits = 0
+        for page in pages:
+            bits |= 1 << page
+        return cls(bits)
+
+    @classmethod
+    def all(cls, page_count):
+        return cls((1 << page_count) - 1)
+
+    def __contains__(self, page):
+        return page >= 0 and (self.bits >> page) & 1 == 1
+
+    def __iter__(self):
+        for run in self.runs():
+            yield from run
+
+    def __len__(self):
+        return self.bits.bit_count()
+
+    def __bool__(self):
+        return self.bits != 0
+
+    def __eq__(self, other):
+        return isinstance(other, PageSelection) and self.bits == other.bits
+
+    def __or__(self, other):
+        return PageSelection(self.bits | other.bits)
+
+    def __repr__(self):
+        return f"PageSelection({str(self)!r})"
+
+    def __str__(self):
+        return ", ".join(
+            str(run.start + 1) if len(run) == 1 else f"{run.start + 1}-{run.stop}" for run in self.runs()
+        )
+
+    def toggle(self, page):
+        self.bits ^= 1 << page
+
+    def runs(self):
+        # Contiguous selected pages as ranges, found in one pass over the bits.
+        if not self.bits:
+            return []
+        return [range(match.start(), match.end()) for match in RUN_OF_PAGES.finditer(format(self.bits, "b")[::-1])]
@@ -0,0 +1,412 @@
+import argparse
+from collections import OrderedDict, deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import json
+import multiprocessing
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+from urllib.parse import parse_qs, urlsplit
+import uuid
+import zipfile
+
+from pdf_editor.cli import OPERATIONS, apply_job_defaults, check_job, new_optimizer, parse_metadata, run_operation
+from pdf_editor.operations import merge_pdfs_to_file
+
+CHUNK_SIZE = 1024 * 1024
+LATENCY_BUCKETS = (0.1, 0.5, 1, 2.5, 5, 10, 30, 60, 300)
+INT_PARAMETERS = ("angle", "target", "image_dpi", "image_quality")
+FLAG_PARAMETERS = ("optimize", "incremental")
+
+
+def job_from_query(operation, query):
+    # Query parameters use the option names of the command line: pages, angle,
+    # target, password, set (repeated KEY=VALUE), optimize, incremental,
+    # image_dpi and image_quality.
+    params = parse_qs(query, keep_blank_values=True)
+    job = {"operation": operation}
+    for key in ("pages", "password"):
+        if key in params:
+            job[key] = params[key][-1]
+    for key in INT_PARAMETERS:
+        if key in params:
+            try:
+                job[key] = int(params[key][-1])
+            except ValueError:
+                raise ValueError(f"{key} must be an integer") from None
+    for key in FLAG_PARAMETERS:
+        if key in params:
+            job[key] = params[key][-1].lower() not in ("0", "false", "no")
+    if "set" in params:
+        job["metadata"] = parse_metadata(params["set"])
+
+    apply_job_defaults(job)
+    check_job(job)
+    return job
+
+
+def run_job(job, input_path, output_path):
+    # Runs in a worker process. A merge takes a ZIP of PDFs, merged in name
+    # order; every other operation takes one PDF.
+    started = time.time()
+    optimizer = new_optimizer(job)
+    with open(output_path, "wb") as output_file:
+        if job["operation"] == "merge":
+            paths = extract_archive(input_path)
+            merge_pdfs_to_file(paths, range(len(paths)), output_file, optimizer)
+        else:
+            run_operation(job, input_path, optimizer, output_file)
+
+    return {
+        "started": started,
+        "run_seconds": time.time() - started,
+        "output_bytes": os.path.getsize(output_path),
+        "optimization": optimizer.report if optimizer is not None else None,
+    }
+
+
+def extract_archive(input_path):
+    input_dir = os.path.join(os.path.dirname(input_path), "inputs")
+    os.makedirs(input_dir, exist_ok=True)
+    paths = []
+    with zipfile.ZipFile(input_path) as archive:
+        names = sorted(name for name in archive.namelist() if name.lower().endswith(".pdf"))
+        for index, name in enumerate(names):
+            path = os.path.join(input_dir, f"{index}.pdf")
+            with archive.open(name) as member, open(path, "wb") as pdf_file:
+                shutil.copyfileobj(member, pdf_file, CHUNK_SIZE)
+            paths.append(path)
+    if not paths:
+        raise ValueError("the archive contains no PDF files")
+    return paths
+
+
+class JobQueue:
+    # Jobs run on a fixed pool of worker processes. At most max_queued jobs
+    # wait behind the running ones; a caller that finds the queue full is
+    # turned away before it uploads anything. Jobs wait here rather than in
+    # the executor, which takes a job as soon as it has room in its call
+    # queue, so the executor only ever holds running jobs. Finished jobs keep
+    # their output until deleted or until more than max_finished have piled
+    # up.
+
+    def __init__(self, workers, max_queued, job_dir, max_finished=256):
+        self.workers = workers
+        self.max_queued = max_queued
+        self.job_dir = job_dir
+        self.max_finished = max_finished
+
+        self._executor = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"))
+        self._lock = threading.Lock()
+        self._jobs = OrderedDict()
+        self._reserved = 0
+        self._running = 0
+        self._pending = deque()
+        self._finished = OrderedDict()
+        self._counts = {"done": 0, "failed": 0, "rejected": 0}
+        self._latency_buckets = [0] * len(LATENCY_BUCKETS)
+        self._latency_sum = 0.0
+
+    def reserve(self):
+        with self._lock:
+            if self._reserved >= self.workers + self.max_queued:
+                self._counts["rejected"] += 1
+                return False
+            self._reserved += 1
+            return True
+
+    def release(self):
+        with self._lock:
+            self._reserved -= 1
+
+    def new_job_dir(self):
+        job_id = uuid.uuid4().hex
+        path = os.path.join(self.job_dir, job_id)
+        os.makedirs(path)
+        return job_id, path
+
+    def submit(self, job_id, job, input_path):
+        record = {
+            "id": job_id,
+            "operation": job["operation"],
+            "submitted": time.time(),
+            "input_bytes": os.path.getsize(input_path),
+            "output_path": os.path.join(os.path.dirname(input_path), "output.pdf"),
+            "started": False,
+            "result": None,
+            "error": None,
+        }
+        with self._lock:
+            self._jobs[job_id] = record
+            self._pending.append((record, job, input_path))
+        self._dispatch()
+        return record
+
+    def _dispatch(self):
+        while True:
+            with self._lock:
+                if self._running >= self.workers or not self._pending:
+                    return
+                record, job, input_path = self._pending.popleft()
+                self._running += 1
+                record["started"] = True
+            try:
+                future = self._executor.submit(run_job, job, input_path, record["output_path"])
+            except Exception as e:
+                # A broken pool fails the job instead of holding its worker
+                # slot forever.
+                future = Future()
+                future.set_exception(e)
+            future.add_done_callback(lambda future, record=record: self._finish(record, future))
+
+    def _finish(self, record, future):
+        try:
+            record["result"] = future.result()
+        except Exception as e:
+            record["error"] = str(e) or e.__class__.__name__
+
+        latency = time.time() - record["submitted"]
+        with self._lock:
+            self._reserved -= 1
+            self._running -= 1
+            self._counts["failed" if record["error"] else "done"] += 1
+            self._latency_sum += latency
+            for index, bound in enumerate(LATENCY_BUCKETS):
+                if latency <= bound:
+                    self._latency_buckets[index] += 1
+            self._finished[record["id"]] = True
+            expired = []
+            while len(self._finished) > self.max_finished:
+                expired.append(self._finished.popitem(last=False)[0])
+        for job_id in expired:
+            self.remove(job_id)
+        self._dispatch()
+
+    def get(self, job_id):
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def remove(self, job_id):
+        with self._lock:
+            record = self._jobs.pop(job_id, None)
+            self._finished.pop(job_id, None)
+        if record is not None:
+            shutil.rmtree(os.path.dirname(record["output_path"]), ignore_errors=True)
+        return record
+
+    def status(self, record):
+        if record["error"] is not None:
+            state = "failed"
+        elif record["result"] is not None:
+            state = "done"
+        elif record["started"]:
+            state = "running"
+        else:
+            state = "queued"
+
+        status = {
+            "id": record["id"],
+            "operation": record["operation"],
+            "state": state,
+            "input_bytes": record["input_bytes"],
+            "seconds": time.time() - record["submitted"],
+        }
+        if record["error"] is not None:
+            status["error"] = record["error"]
+        if record["result"] is not None:
+            result = record["result"]
+            status.update({
+                "queue_seconds": result["started"] - record["submitted"],
+                "run_seconds": result["run_seconds"],
+                "seconds": result["started"] + result["run_seconds"] - record["submitted"],
+                "output_bytes": result["output_bytes"],
+                "optimization": result["optimization"],
+            })
+        return status
+
+    def stats(self):
+        with self._lock:
+            records = list(self._jobs.values())
+            counts = dict(self._counts)
+            buckets = list(self._latency_buckets)
+            latency_sum = self._latency_sum
+
+        states = [self.status(record)["state"] for record in records]
+        return {
+            "queued": states.count("queued"),
+            "running": states.count("running"),
+            "counts": counts,
+            "latency_buckets": buckets,
+            "latency_sum": latency_sum,
+        }
+
+    def prometheus_text(self):
+        stats = self.stats()
+        lines = [
+            "# TYPE pdf_editor_jobs_queued gauge",
+            f"pdf_editor_jobs_queued {stats['queued']}",
+            "# TYPE pdf_editor_jobs_running gauge",
+            f"pdf_editor_jobs_running {stats['running']}",
+            "# TYPE pdf_editor_jobs_total counter",
+        ]
+        for state, count in sorted(stats["counts"].items()):
+            lines.append(f'pdf_editor_jobs_total{{state="{state}"}} {count}')
+
+        lines.append("# TYPE pdf_editor_job_seconds histogram")
+        for bound, count in zip(LATENCY_BUCKETS, stats["latency_buckets"]):
+            lines.append(f'pdf_editor_job_seconds_bucket{{le="{bound}"}} {count}')
+        finished = stats["counts"]["done"] + stats["counts"]["failed"]
+        lines.append(f'pdf_editor_job_seconds_bucket{{le="+Inf"}} {finished}')
+        lines.append(f"pdf_editor_job_seconds_sum {stats['latency_sum']}")
+        lines.append(f"pdf_editor_job_seconds_count {finished}")
+        return "\n".join(lines) + "\n"
+
+    def shutdown(self):
+        with self._lock:
+            self._pending.clear()
+        self._executor.shutdown(wait=True, cancel_futures=True)
+
+
+class JobRequestHandler(BaseHTTPRequestHandler):
+    # POST /jobs/<operation>   body: the PDF (a ZIP of PDFs for merge)
+    # GET  /jobs/<id>          job status as JSON
+    # GET  /jobs/<id>/result   the output PDF
+    # DELETE /jobs/<id>        drop a finished job and its files
+    # GET  /metrics            queue depth and job latency for Prometheus
+    server_version = "pdf-editor"
+
+    def do_POST(self):
+        url = urlsplit(self.path)
+        parts = url.path.strip("/").split("/")
+        if len(parts) != 2 or parts[0] != "jobs":
+            return self.send_json(404, {"error": "not found"})
+
+        try:
+            job = job_from_query(parts[1], url.query)
+        except ValueError as e:
+            return self.send_json(400, {"error": str(e)})
+
+        try:
+            length = int(self.headers.get("Content-Length", ""))
+        except ValueError:
+            length = -1
+        if length < 0:
+            return self.send_json(400, {"error": "a Content-Length of zero or more bytes is required"})
+        if length > self.server.max_upload_bytes:
+            return self.send_json(413, {"error": f"uploads are limited to {self.server.max_upload_bytes} bytes"})
+
+        queue = self.server.queue
+        if not queue.reserve():
+            return self.send_json(503, {"error": "the job queue is full, retry later"}, {"Retry-After": "1"})
+
+        job_id, job_path = queue.new_job_dir()
+        input_path = os.path.join(job_path, "input.zip" if job["operation"] == "merge" else "input.pdf")
+        try:
+            with open(input_path, "wb") as input_file:
+                remaining = length
+                while remaining:
+                    chunk = self.rfile.read(min(CHUNK_SIZE, remaining))
+                    if not chunk:
+                        raise ConnectionError("request body ended early")
+                    input_file.write(chunk)
+                    remaining -= len(chunk)
+            record = queue.submit(job_id, job, input_path)
+        except Exception:
+            queue.release()
+            queue.remove(job_id)
+            shutil.rmtree(job_path, ignore_errors=True)
+            raise
+
+        self.send_json(202, queue.status(record), {"Location": f"/jobs/{job_id}"})
+
+    def do_GET(self):
+        parts = urlsplit(self.path).path.strip("/").split("/")
+        queue = self.server.queue
+        if parts == ["metrics"]:
+            return self.send_body(200, queue.prometheus_text().encode(), "text/plain; version=0.0.4")
+
+        record = queue.get(parts[1]) if len(parts) in (2, 3) and parts[0] == "jobs" else None
+        if record is None or (len(parts) == 3 and parts[2] != "result"):
+            return self.send_json(404, {"error": "not found"})
+
+        status = queue.status(record)
+        if len(parts) == 2:
+            return self.send_json(200, status)
+        if status["state"] != "done":
+            return self.send_json(409, status)
+
+        with open(record["output_path"], "rb") as output_file:
+            self.send_response(200)
+            self.send_header("Content-Type", "application/pdf")
+            self.send_header("Content-Length", str(status["output_bytes"]))
+            self.end_headers()
+            shutil.copyfileobj(output_file, self.wfile, CHUNK_SIZE)
+
+    def do_DELETE(self):
+        parts = urlsplit(self.path).path.strip("/").split("/")
+        queue = self.server.queue
+        record = queue.get(parts[1]) if len(parts) == 2 and parts[0] == "jobs" else None
+        if record is None:
+            return self.send_json(404, {"error": "not found"})
+        if queue.status(record)["state"] in ("queued", "running"):
+            return self.send_json(409, {"error": "the job has not finished"})
+        queue.remove(record["id"])
+        self.send_body(204, b"", None)
+
+    def send_json(self, code, body, headers=None):
+        self.send_body(code, json.dumps(body).encode(), "application/json", headers)
+
+    def send_body(self, code, body, content_type, headers=None):
+        self.send_response(code)
+        if content_type:
+            self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog="pdf-editor-server", description="Serve PDF Editor operations as HTTP jobs.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="number of worker processes")
+    parser.add_argument("--max-queue", dest="max_queue", type=int, help="jobs that may wait for a worker (default: 4 per worker)")
+    parser.add_argument("--max-upload-mb", dest="max_upload_mb", type=int, default=1024)
+    parser.add_argument("--job-dir", dest="job_dir", help="directory for job inputs and outputs (default: a new temp directory)")
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    if args.job_dir:
+        os.makedirs(args.job_dir, exist_ok=True)
+    job_dir = tempfile.mkdtemp(prefix="pdf_editor_jobs_", dir=args.job_dir)
+    max_queue = args.max_queue if args.max_queue is not None else 4 * args.workers
+
+    server = ThreadingHTTPServer((args.host, args.port), JobRequestHandler)
+    server.queue = JobQueue(args.workers, max_queue, job_dir)
+    server.max_upload_bytes = args.max_upload_mb * 1024 ** 2
+    print(
+        f"Serving {', '.join(OPERATIONS)} on http://{args.host}:{server.server_port} "
+        f"with {args.workers} workers and room for {max_queue} queued jobs",
+        flush=True,
+    )
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        server.queue.shutdown()
+        shutil.rmtree(job_dir, ignore_errors=True)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,184 @@
+from collections import deque, namedtuple
+from concurrent.futures import ProcessPoolExecutor
+import multiprocessing
+import os
+import re
+import shutil
+import tempfile
+import zipfile
+
+from pypdf import PdfWriter
+
+from pdf_editor.instrumentation import span
+from pdf_editor.operations import read_pdf, source_nbytes
+from pdf_editor.optimization import OutputOptimizer
+from pdf_editor.spool import is_path
+
+SPLIT_WORKERS = max(1, os.cpu_count() or 1)
+# Below this many pages per worker, starting worker processes costs more than
+# it saves.
+MIN_PAGES_PER_WORKER = 200
+
+# One output file: pages start to stop - 1 of the source, stored as name.
+Part = namedtuple("Part", ["name", "start", "stop"])
+
+
+def part_name(index, start, stop, title=None):
+    label = f"pages_{start + 1}" if stop - start == 1 else f"pages_{start + 1}-{stop}"
+    if title:
+        label = re.sub(r"[^\w\- ]+", "_", title).strip(" _")[:80] or label
+    return f"{index + 1:03d}_{label}.pdf"
+
+
+def range_parts(ranges, page_count):
+    # One part per range from parse_ranges(); ranges past the end are dropped.
+    parts = []
+    for start, stop in ranges:
+        stop = page_count if stop is None else min(stop, page_count)
+        if start < stop:
+            parts.append(Part(part_name(len(parts), start, stop), start, stop))
+    return parts
+
+
+def every_parts(page_count, every):
+    return [
+        Part(part_name(index, start, min(start + every, page_count)), start, min(start + every, page_count))
+        for index, start in enumerate(range(0, page_count, every))
+    ]
+
+
+def bookmark_parts(pdf_reader):
+    # One part per top-level bookmark, running to the next one. Pages before
+    # the first bookmark become a part of their own.
+    starts = {}
+    for item in pdf_reader.outline:
+        if isinstance(item, list):
+            continue
+        page_num = pdf_reader.get_destination_page_number(item)
+        if page_num is not None and page_num >= 0 and page_num not in starts:
+            starts[page_num] = item.title
+
+    page_count = len(pdf_reader.pages)
+    if starts and 0 not in starts:
+        starts[0] = None
+
+    bounds = sorted(starts) + [page_count]
+    return [
+        Part(part_name(index, start, stop, starts[start]), start, stop)
+        for index, (start, stop) in enumerate(zip(bounds, bounds[1:]))
+    ]
+
+
+class ZipEntryStream:
+    # pypdf asks its output for the current offset while writing, which a
+    # ZIP entry opened for writing cannot answer.
+
+    def __init__(self, entry):
+        self.entry = entry
+        self.position = 0
+
+    def write(self, data):
+        self.entry.write(data)
+        self.position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self.position
+
+    def flush(self):
+        self.entry.flush()
+
+
+def write_part(pdf_reader, part, output, optimizer=None):
+    pdf_writer = PdfWriter()
+    for page_num in range(part.start, part.stop):
+        pdf_writer.add_page(pdf_reader.pages[page_num])
+    if pdf_reader.metadata:
+        pdf_writer.add_metadata(pdf_reader.metadata)
+
+    if optimizer is not None:
+        optimizer.optimize_writer(pdf_writer)
+    pdf_writer.write(output)
+
+
+_worker_reader = None
+
+
+def write_part_file(path, part, part_path, optimizer_settings):
+    # Runs in a worker process, which parses the source once and keeps the
+    # reader for every part it is given.
+    global _worker_reader
+    if _worker_reader is None or _worker_reader[0] != path:
+        _worker_reader = (path, read_pdf(path))
+
+    optimizer = OutputOptimizer(*optimizer_settings) if optimizer_settings else None
+    with open(part_path, "wb") as part_file:
+        write_part(_worker_reader[1], part, part_file, optimizer)
+    return optimizer.report if optimizer is not None else None
+
+
+def split_to_zip(pdf_source, parts, output, optimizer=None, workers=None, spool_dir=None):
+    # Writes every part into one ZIP on output. Parts are streamed into their
+    # entries, so no finished part is held in memory. A large split of a file
+    # on disk is spread over worker processes, which write parts to a scratch
+    # directory that the archive drains in order. PDFs are mostly compressed
+    # already, so entries are stored as they are.
+    page_total = sum(part.stop - part.start for part in parts)
+    if workers is None:
+        workers = min(SPLIT_WORKERS, len(parts), page_total // MIN_PAGES_PER_WORKER)
+
+    started = output.tell()
+    with span("write", pages=page_total) as write_span:
+        with zipfile.ZipFile(output, "w", compression=zipfile.ZIP_STORED, allowZip64=True) as archive:
+            if workers > 1 and is_path(pdf_source):
+                bytes_in = os.path.getsize(pdf_source)
+                if optimizer is not None:
+                    optimizer.begin(bytes_in)
+                split_in_workers(pdf_source, parts, archive, optimizer, workers, spool_dir)
+            else:
+                pdf_reader = read_pdf(pdf_source)
+                bytes_in = source_nbytes(pdf_reader)
+                if optimizer is not None:
+                    optimizer.begin(bytes_in)
+                for part in parts:
+                    with archive.open(part.name, "w", force_zip64=True) as entry:
+                        write_part(pdf_reader, part, ZipEntryStream(entry), optimizer)
+        write_span.set(bytes_in=bytes_in, bytes_out=output.tell() - started)
+
+    if optimizer is not None:
+        optimizer.finish(output.tell() - started)
+    return output
+
+
+def split_in_workers(path, parts, archive, optimizer, workers, spool_dir):
+    optimizer_settings = None
+    if optimizer is not None:
+        optimizer_settings = (optimizer.image_dpi, optimizer.image_quality, optimizer.compression_level)
+
+    scratch_dir = tempfile.mkdtemp(prefix="pdf_editor_split_", dir=spool_dir)
+    # Worker processes are spawned, not forked, so they do not inherit the
+    # threads of a running server.
+    context = multiprocessing.get_context("spawn")
+    try:
+        with ProcessPoolExecutor(max_workers=workers, mp_context=context) as executor:
+            # At most two parts per worker are in flight, which bounds the
+            # scratch space to a few parts however many there are.
+            pending = deque()
+            for index, part in enumerate(parts):
+                part_path = os.path.join(scratch_dir, f"{index}.pdf")
+                pending.append((part, part_path, executor.submit(write_part_file, path, part, part_path, optimizer_settings)))
+                if len(pending) >= 2 * workers:
+                    drain_part(archive, pending.popleft(), optimizer)
+            while pending:
+                drain_part(archive, pending.popleft(), optimizer)
+    finally:
+        shutil.rmtree(scratch_dir, ignore_errors=True)
+
+
+def drain_part(archive, pending_part, optimizer):
+    part, part_path, future = pending_part
+    report = future.result()
+    if optimizer is not None:
+        optimizer.add_report(report)
+    archive.write(part_path, part.name)
+    os.remove(part_path)
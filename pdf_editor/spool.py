@@ -0,0 +1,50 @@
+from io import BytesIO
+import hashlib
+import mmap
+import os
+import threading
+
+
+def is_path(pdf_source):
+    return isinstance(pdf_source, (str, os.PathLike))
+
+
+def open_source(pdf_source):
+    # A seekable stream over a PDF given as a path, bytes or a stream. Files
+    # are memory-mapped, so a parser only pages in what it reads and nothing
+    # is copied onto the heap.
+    if is_path(pdf_source):
+        with open(pdf_source, "rb") as pdf_file:
+            return mmap.mmap(pdf_file.fileno(), 0, access=mmap.ACCESS_READ)
+    if isinstance(pdf_source, (bytes, bytearray, memoryview)):
+        return BytesIO(pdf_source)
+    return pdf_source
+
+
+def document_digest(pdf_source):
+    if is_path(pdf_source):
+        with open_source(pdf_source) as mapped:
+            return hashlib.sha256(mapped).hexdigest()
+    return hashlib.sha256(pdf_source).hexdigest()
+
+
+def input_nbytes(pdf_source):
+    if is_path(pdf_source):
+        return os.path.getsize(pdf_source)
+    if isinstance(pdf_source, (bytes, bytearray, memoryview, mmap.mmap)):
+        return len(pdf_source)
+    position = pdf_source.tell()
+    size = pdf_source.seek(0, os.SEEK_END)
+    pdf_source.seek(position)
+    return size
+
+
+def spool_upload(uploaded_file, path):
+    # Writes an upload to path straight from its buffer, once; later calls
+    # for the same path reuse the file.
+    if not os.path.exists(path):
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "wb") as spool_file:
+            spool_file.write(uploaded_file.getbuffer())
+        os.replace(tmp_path, path)
+    return path
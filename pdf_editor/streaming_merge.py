@@ -0,0 +1,178 @@
+from hashlib import sha256
+from io import BytesIO
+
+from pypdf import PdfReader
+from pypdf.generic import ArrayObject, DictionaryObject, IndirectObject, NameObject, NumberObject, StreamObject
+
+from pdf_editor.optimization import page_image_side
+from pdf_editor.spool import open_source
+
+CATALOG_NUMBER = 1
+PAGES_NUMBER = 2
+
+# Dictionaries of these types are safe to share between pages, so identical
+# copies coming from different inputs are written once. Streams (images, font
+# programs, content streams) are always shareable.
+SHAREABLE_TYPES = {"/Font", "/FontDescriptor", "/ExtGState", "/XObject", "/Pattern", "/Shading"}
+
+
+def is_page_tree_parent(key, value):
+    # A /Parent leading into the source's page tree would pull in every page
+    # of the source; the output has a page tree of its own.
+    return key == "/Parent" and isinstance(value, IndirectObject) and value.get_object().get("/Type") == "/Pages"
+
+
+class StreamingPdfWriter:
+    # Writes each input's pages and everything they reference straight to the
+    # output file, keeping only object offsets, the page list and content
+    # digests in memory. A source reader is released as soon as its pages
+    # have been written, so memory does not grow with the number of inputs.
+    # An OutputOptimizer, if given, rewrites each source stream on its way out.
+
+    def __init__(self, output, optimizer=None):
+        self.output = output
+        self.optimizer = optimizer
+        self.deduplicated = 0
+
+        self._start = output.tell()
+        self._offsets = {}
+        self._next_number = PAGES_NUMBER + 1
+        self._kids = []
+        self._digests = {}
+        self._image_side = None
+
+        output.write(b"%PDF-1.7\n%\xe2\xe3\xcf\xd3\n")
+
+    @property
+    def page_count(self):
+        return len(self._kids)
+
+    @property
+    def bytes_written(self):
+        return self.output.tell() - self._start
+
+    def add_document(self, pdf_file):
+        pdf_reader = PdfReader(open_source(pdf_file))
+        # Every page gets its output number up front, so a reference to a
+        # page that is not written yet (a link destination, an annotation's
+        # /P) points at that page instead of copying it.
+        numbers = {}
+        for page in pdf_reader.pages:
+            if page.indirect_reference is not None:
+                numbers[(page.indirect_reference.idnum, page.indirect_reference.generation)] = self._allocate()
+        for page in pdf_reader.pages:
+            self._kids.append(self._write_page(page, numbers))
+
+    def close(self):
+        pages = DictionaryObject({
+            NameObject("/Type"): NameObject("/Pages"),
+            NameObject("/Kids"): ArrayObject(IndirectObject(number, 0, None) for number in self._kids),
+            NameObject("/Count"): NumberObject(len(self._kids)),
+        })
+        self._write_object(PAGES_NUMBER, pages)
+
+        catalog = DictionaryObject({
+            NameObject("/Type"): NameObject("/Catalog"),
+            NameObject("/Pages"): IndirectObject(PAGES_NUMBER, 0, None),
+        })
+        self._write_object(CATALOG_NUMBER, catalog)
+
+        xref_offset = self.output.tell() - self._start
+        self.output.write(f"xref\n0 {self._next_number}\n0000000000 65535 f \n".encode())
+        for number in range(1, self._next_number):
+            self.output.write(f"{self._offsets[number]:010d} 00000 n \n".encode())
+        self.output.write(
+            f"trailer\n<< /Size {self._next_number} /Root {CATALOG_NUMBER} 0 R >>\n"
+            f"startxref\n{xref_offset}\n%%EOF\n".encode()
+        )
+
+    def _allocate(self):
+        number = self._next_number
+        self._next_number += 1
+        return number
+
+    def _write_page(self, page, numbers):
+        if page.indirect_reference is not None:
+            page_number = numbers[(page.indirect_reference.idnum, page.indirect_reference.generation)]
+        else:
+            page_number = self._allocate()
+        if self.optimizer is not None and self.optimizer.image_dpi:
+            self._image_side = page_image_side(page, self.optimizer.image_dpi)
+
+        body = DictionaryObject()
+        for key, value in page.items():
+            if key != "/Parent":
+                body[NameObject(key)] = self._convert(value, numbers)
+        body[NameObject("/Parent")] = IndirectObject(PAGES_NUMBER, 0, None)
+
+        self._write_object(page_number, body)
+        return page_number
+
+    def _convert(self, value, numbers):
+        if isinstance(value, IndirectObject):
+            return IndirectObject(self._resolve(value, numbers), 0, None)
+        if isinstance(value, StreamObject):
+            converted = value.__class__()
+            for key, item in value.items():
+                if key != "/Length" and not is_page_tree_parent(key, item):
+                    converted[NameObject(key)] = self._convert(item, numbers)
+            converted._data = value._data
+            return converted
+        if isinstance(value, DictionaryObject):
+            return DictionaryObject({
+                NameObject(key): self._convert(item, numbers)
+                for key, item in value.items() if not is_page_tree_parent(key, item)
+            })
+        if isinstance(value, ArrayObject):
+            return ArrayObject(self._convert(item, numbers) for item in value)
+        return value
+
+    def _resolve(self, reference, numbers):
+        key = (reference.idnum, reference.generation)
+        if key in numbers:
+            if numbers[key] is None:
+                # Referenced from inside itself: it needs a number before its
+                # body is known, so it cannot be deduplicated.
+                numbers[key] = self._allocate()
+            return numbers[key]
+
+        numbers[key] = None
+        value = reference.get_object()
+        if self.optimizer is not None and isinstance(value, StreamObject):
+            value = self.optimizer.optimize_stream(value, self._image_side)
+        converted = self._convert(value, numbers)
+
+        reserved = numbers[key]
+        if reserved is not None:
+            self._write_object(reserved, converted)
+            return reserved
+
+        buffer = BytesIO()
+        converted.write_to_stream(buffer)
+        data = buffer.getvalue()
+
+        digest = None
+        if isinstance(value, StreamObject) or (isinstance(value, DictionaryObject) and value.get("/Type") in SHAREABLE_TYPES):
+            digest = sha256(data).digest()
+            if digest in self._digests:
+                self.deduplicated += 1
+                numbers[key] = self._digests[digest]
+                return numbers[key]
+
+        number = self._allocate()
+        if digest is not None:
+            self._digests[digest] = number
+        self._write_raw(number, data)
+        numbers[key] = number
+        return number
+
+    def _write_object(self, number, value):
+        buffer = BytesIO()
+        value.write_to_stream(buffer)
+        self._write_raw(number, buffer.getvalue())
+
+    def _write_raw(self, number, data):
+        self._offsets[number] = self.output.tell() - self._start
+        self.output.write(f"{number} 0 obj\n".encode())
+        self.output.write(data)
+        self.output.write(b"\nendobj\n")
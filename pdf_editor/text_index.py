@@ -0,0 +1,158 @@
+from collections import OrderedDict, defaultdict
+from concurrent.futures import ProcessPoolExecutor
+import multiprocessing
+import os
+import re
+import threading
+
+from pdf_editor.operations import read_pdf
+from pdf_editor.selection import PageSelection
+
+INDEX_WORKERS = max(1, os.cpu_count() or 1)
+PAGES_PER_TASK = 50
+TERM = re.compile(r"\w+")
+
+_executor = None
+_executor_lock = threading.Lock()
+_worker_reader = None
+
+
+def terms(text):
+    return set(TERM.findall(text.lower()))
+
+
+def extract_terms(path, first, last):
+    # Runs in a worker process, which parses each source once and keeps the
+    # reader for the next chunk of the same document.
+    global _worker_reader
+    if _worker_reader is None or _worker_reader[0] != path:
+        _worker_reader = (path, read_pdf(path))
+    pdf_reader = _worker_reader[1]
+
+    page_terms = []
+    for page_num in range(first, last):
+        try:
+            page_terms.append(terms(pdf_reader.pages[page_num].extract_text()))
+        except Exception:
+            # A page whose text cannot be extracted is simply not found.
+            page_terms.append(set())
+    return page_terms
+
+
+def close_index_reader(paths):
+    # Runs in a worker process: drops the kept reader, and the memory map
+    # under it, when its file is being removed.
+    global _worker_reader
+    if _worker_reader is not None and _worker_reader[0] in paths:
+        _worker_reader[1].stream.close()
+        _worker_reader = None
+
+
+def index_executor():
+    # Shared by every session. Text extraction is pure Python, so it runs in
+    # spawned processes rather than threads.
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ProcessPoolExecutor(max_workers=INDEX_WORKERS, mp_context=multiprocessing.get_context("spawn"))
+        return _executor
+
+
+def release_index_files(paths):
+    # As release_pdfium_files: one task per worker, which is the best a
+    # shared pool can do towards reaching all of them.
+    with _executor_lock:
+        if _executor is not None:
+            for _ in range(INDEX_WORKERS):
+                _executor.submit(close_index_reader, tuple(paths))
+
+
+class TextIndex:
+    # Inverted index from lowercased words to the source pages containing
+    # them, each page set kept as PageSelection bits. Pages are added as
+    # worker chunks finish, so a search during indexing returns the matches
+    # among the pages indexed so far.
+
+    def __init__(self, page_count):
+        self.page_count = page_count
+        self.indexed = 0
+        self.error = None
+
+        self._lock = threading.Lock()
+        self._terms = defaultdict(int)
+
+    @property
+    def done(self):
+        return self.indexed >= self.page_count
+
+    def add_pages(self, first, page_terms):
+        with self._lock:
+            for page_num, words in enumerate(page_terms, start=first):
+                bit = 1 << page_num
+                for word in words:
+                    self._terms[word] |= bit
+            self.indexed += len(page_terms)
+
+    def search(self, query):
+        # Source pages containing every word of query.
+        words = terms(query)
+        if not words:
+            return PageSelection()
+        with self._lock:
+            bits = -1
+            for word in words:
+                bits &= self._terms.get(word, 0)
+        return PageSelection(bits)
+
+
+def plan_matches(plan_pages, source, matches):
+    # Remaps source page matches onto positions in the current page plan, so
+    # the index never has to be rebuilt after rotate, reorder or delete.
+    return PageSelection.from_pages(
+        position for position, plan_page in enumerate(plan_pages)
+        if plan_page.source == source and plan_page.page_index in matches
+    )
+
+
+class TextIndexCache:
+    # Text indexes keyed by document digest, shared by every session. An index
+    # is built in the background the first time a document is asked for; the
+    # least recently used are dropped beyond max_documents.
+
+    def __init__(self, max_documents=16):
+        self.max_documents = max_documents
+
+        self._lock = threading.Lock()
+        self._indexes = OrderedDict()
+
+    def index(self, digest, path, page_count):
+        with self._lock:
+            text_index = self._indexes.get(digest)
+            if text_index is not None:
+                self._indexes.move_to_end(digest)
+                return text_index
+
+            text_index = TextIndex(page_count)
+            self._indexes[digest] = text_index
+            while len(self._indexes) > self.max_documents:
+                self._indexes.popitem(last=False)
+
+        executor = index_executor()
+        for first in range(0, page_count, PAGES_PER_TASK):
+            future = executor.submit(extract_terms, path, first, min(first + PAGES_PER_TASK, page_count))
+            future.add_done_callback(lambda done, first=first: self._add_chunk(digest, text_index, first, done))
+        return text_index
+
+    def _add_chunk(self, digest, text_index, first, future):
+        try:
+            text_index.add_pages(first, future.result())
+        except Exception as e:
+            # Forget a failed index so the next request builds it again.
+            text_index.error = str(e)
+            with self._lock:
+                if self._indexes.get(digest) is text_index:
+                    del self._indexes[digest]
+
+    def stats(self):
+        with self._lock:
+            return {"text_indexes": len(self._indexes)}
@@ -0,0 +1,39 @@
+import os
+
+from pypdf import PdfReader, PdfWriter
+
+from pdf_editor.cli import main
+
+
+def write_pdf(path, page_count):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    pdf_writer = PdfWriter()
+    for _ in range(page_count):
+        pdf_writer.add_blank_page(100, 100)
+    with open(path, "wb") as pdf_file:
+        pdf_writer.write(pdf_file)
+
+
+def test_same_name_in_different_directories(tmp_path):
+    write_pdf(str(tmp_path / "in" / "a" / "doc.pdf"), 1)
+    write_pdf(str(tmp_path / "in" / "b" / "doc.pdf"), 2)
+    out = tmp_path / "out"
+
+    status = main(["rotate", str(tmp_path / "in" / "**" / "*.pdf"), "--output-dir", str(out), "--workers", "1"])
+
+    assert status == 0
+    assert len(PdfReader(str(out / "a" / "doc_rotated.pdf")).pages) == 1
+    assert len(PdfReader(str(out / "b" / "doc_rotated.pdf")).pages) == 2
+
+
+def test_inputs_writing_the_same_output_fail(tmp_path):
+    write_pdf(str(tmp_path / "a" / "doc.pdf"), 1)
+    write_pdf(str(tmp_path / "b" / "doc.pdf"), 2)
+    out = tmp_path / "out"
+
+    status = main([
+        "rotate", str(tmp_path / "a" / "*.pdf"), str(tmp_path / "b" / "*.pdf"), "--output-dir", str(out), "--workers", "1"
+    ])
+
+    assert status == 1
+    assert not (out / "doc_rotated.pdf").exists()
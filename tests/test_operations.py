@@ -0,0 +1,39 @@
+from io import BytesIO
+
+from pypdf import PdfReader, PdfWriter
+
+from pdf_editor.operations import edit_metadata
+
+
+def pdf_with_metadata(metadata):
+    pdf_writer = PdfWriter()
+    pdf_writer.add_blank_page(100, 100)
+    pdf_writer.add_metadata(metadata)
+    output = BytesIO()
+    pdf_writer.write(output)
+    return output.getvalue()
+
+
+def current_metadata(data):
+    return {key: str(value) for key, value in PdfReader(BytesIO(data)).metadata.items()}
+
+
+def test_added_metadata_is_saved_incrementally():
+    data = pdf_with_metadata({"/Title": "Draft"})
+
+    output = edit_metadata(BytesIO(data), {**current_metadata(data), "/Author": "Someone"}, incremental=True).getvalue()
+
+    assert output.startswith(data)
+    assert PdfReader(BytesIO(output)).metadata["/Author"] == "Someone"
+
+
+def test_changed_or_removed_metadata_is_rewritten():
+    data = pdf_with_metadata({"/Title": "Secret title", "/Subject": "Secret subject"})
+    metadata = current_metadata(data)
+    del metadata["/Subject"]
+    metadata["/Title"] = "Public"
+
+    output = edit_metadata(BytesIO(data), metadata, incremental=True).getvalue()
+
+    assert b"Secret" not in output
+    assert PdfReader(BytesIO(output)).metadata["/Title"] == "Public"